@@ -0,0 +1,113 @@
+"""Edge throughput of `HypergraphBuilder`'s sugar and `add_edges` vs. raw `edge()`.
+
+    python bench/builder.py [N]
+
+Builds the subset-sum recurrence of `test/test_builder.py` (`G[k, n+1] +=
+G[k, n]` and `G[k, n+1] += w[n] * G[k-1, n]`) and a chain of ternary
+products, three ways each.
+"""
+import gc
+import sys
+from time import perf_counter
+
+import numpy as np
+from semirings import Float
+
+from hypergraphs.builder import HypergraphBuilder
+
+
+def subset_edge(N, K, w):
+    g = HypergraphBuilder(Float, root=(K, N))
+    for n in range(N):
+        g.edge(1.0, (0, n))
+    for k in range(1, K + 1):
+        for n in range(N):
+            g.edge(Float.one, (k, n + 1), (k, n))
+            g.edge(w[n], (k, n + 1), (k - 1, n))
+    return g
+
+
+def subset_sugar(N, K, w):
+    g = HypergraphBuilder(Float, root=(K, N))
+    for n in range(N):
+        g[0, n] = 1.0
+    for k in range(1, K + 1):
+        for n in range(N):
+            g[k, n + 1] += g[k, n]
+            g[k, n + 1] += w[n] * g[k - 1, n]
+    return g
+
+
+def subset_bulk(N, K, w):
+    # Node (k, n) has id k*(N+1) + n.
+    g = HypergraphBuilder(Float, root=(K, N))
+    nodes = [(k, n) for k in range(K + 1) for n in range(N + 1)]
+    n = np.arange(N)
+    g.add_edges(n, np.empty((N, 0), dtype=int), np.ones(N), nodes=nodes)
+    for k in range(1, K + 1):
+        heads = np.repeat(k*(N+1) + n + 1, 2)
+        bodies = np.stack([k*(N+1) + n, (k-1)*(N+1) + n], axis=1).reshape(-1, 1)
+        weights = np.stack([np.ones(N), w], axis=1).reshape(-1)
+        g.add_edges(heads, bodies, weights, nodes=nodes)
+    return g
+
+
+def chain_edge(M):
+    g = HypergraphBuilder(Float, root=M)
+    g.edge(1.0, 0)
+    for i in range(1, M + 1):
+        g.edge(0.5, i, i - 1, i - 1, i - 1)
+    return g
+
+
+def chain_sugar(M):
+    g = HypergraphBuilder(Float, root=M)
+    g[0] = 1.0
+    for i in range(1, M + 1):
+        g[i] += 0.5 * g[i - 1] * g[i - 1] * g[i - 1]
+    return g
+
+
+def chain_bulk(M):
+    g = HypergraphBuilder(Float, root=M)
+    g.add_edges([0], [()], [1.0])
+    i = np.arange(1, M + 1)
+    g.add_edges(i, np.repeat(i - 1, 3).reshape(-1, 3), np.full(M, 0.5))
+    return g
+
+
+def compare(name, builds, repeat=3):
+    "Best of `repeat` builds each, starting from a collected heap."
+    times = {}
+    Z = None
+    for how, build in builds.items():
+        times[how] = float('inf')
+        for _ in range(repeat):
+            g = None; gc.collect()
+            t = perf_counter(); g = build(); times[how] = min(times[how], perf_counter() - t)
+        z = g.Z()
+        assert Z is None or np.isclose(z, Z), (how, z, Z)
+        Z = z
+    E = len(g.edges)
+    print(f'{name}: {E:,} edges')
+    for how, t in times.items():
+        print(f'  {how:10s} {t:8.3f} s   {E/t/1e6:6.2f} M edges/s   {t/times["edge()"]:5.2f}x edge()')
+
+
+def main(N=100_000):
+    K = 5
+    w = np.random.default_rng(0).uniform(size=N).tolist()
+    compare(f'subset sum (N={N:,}, K={K})', {
+        'edge()': lambda: subset_edge(N, K, w),
+        'sugar': lambda: subset_sugar(N, K, w),
+        'add_edges': lambda: subset_bulk(N, K, np.array(w)),
+    })
+    compare(f'ternary chain (M={N:,})', {
+        'edge()': lambda: chain_edge(N),
+        'sugar': lambda: chain_sugar(N),
+        'add_edges': lambda: chain_bulk(N),
+    })
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
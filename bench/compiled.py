@@ -0,0 +1,89 @@
+"""Memory and throughput of `Hypergraph` vs. `CompiledHypergraph`.
+
+    python bench/compiled.py
+"""
+import gc
+import tracemalloc
+from time import perf_counter
+
+import numpy as np
+from semirings import Float
+
+from hypergraphs.apps.cky import cky
+from hypergraphs.apps.parser2 import load_grammar
+from hypergraphs.apps.matrix_chain import matrix_chain
+from hypergraphs.vectorized import inside, REAL
+
+
+GRAMMAR = load_grammar("""
+S       X .
+S       X
+X       X X
+X       X Y
+Y       Y X
+Y       X X
+X       a
+Y       a
+""")
+
+
+def chain(N):
+    g = matrix_chain([1]*(N+1), Float)      # unit costs: Z counts parenthesizations
+    g.kind = Float
+    return g
+
+
+def cky_forest(n):
+    rng = np.random.default_rng(0)
+    def binary(_,X,Y,Z,i,j,k): return rng.uniform()
+    def unary(_,X,Y,i,k):      return rng.uniform()
+    def terminal(_,W,i):       return 1.0
+    return cky(['a']*n + ['.'], GRAMMAR, binary, unary, terminal, kind=Float)
+
+
+def measure(build):
+    "Run `build()`, returning its result, the bytes it retains, and the elapsed time."
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    t = perf_counter()
+    x = build()
+    t = perf_counter() - t
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return x, after - before, t
+
+
+def timeit(f, reps=3):
+    best = float('inf')
+    for _ in range(reps):
+        t = perf_counter(); f(); best = min(best, perf_counter() - t)
+    return best
+
+
+def compare(name, build):
+    g, g_bytes, g_build = measure(build)
+    cg, cg_bytes, cg_build = measure(g.compile)
+    ops = int(cg.num_edges + cg.arity.sum())     # semiring products per inside pass
+    t_g = timeit(g.inside)
+    t_cg = timeit(cg.inside)
+    cg.levels
+    t_np = timeit(lambda: inside(cg, REAL))
+    print(f'{name}: {cg.num_nodes:,} nodes, {cg.num_edges:,} edges')
+    print(f'  memory       Hypergraph {g_bytes/2**20:8.1f} MB   compiled {cg_bytes/2**20:8.1f} MB'
+          f'   (arrays {cg.nbytes/2**20:.1f} MB)')
+    print(f'  build        Hypergraph {g_build:8.3f} s    compile  {cg_build:8.3f} s')
+    print(f'  inside       Hypergraph {t_g:8.3f} s    compiled {t_cg:8.3f} s'
+          f'   ({ops/t_g/1e6:.2f} vs {ops/t_cg/1e6:.2f} M edge-ops/s)')
+    print(f'  inside       numpy      {t_np:8.3f} s'
+          f'                             ({ops/t_np/1e6:.2f} M edge-ops/s)')
+
+
+def main():
+    compare('matrix_chain(N=150)', lambda: chain(150))
+    compare('cky(n=60)', lambda: cky_forest(60))
+
+
+if __name__ == '__main__':
+    main()
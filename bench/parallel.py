@@ -0,0 +1,35 @@
+"""Scaling of the threaded level-wise inside/outside with the number of workers.
+
+    python bench/parallel.py [sentence length]
+"""
+import os
+import sys
+from time import perf_counter
+
+import numpy as np
+
+from hypergraphs.vectorized import inside, outside, REAL
+
+from compiled import cky_forest, timeit
+
+
+def main(n=120):
+    t = perf_counter()
+    cg = cky_forest(n).compile()
+    print(f'cky(n={n}): {cg.num_nodes:,} nodes, {cg.num_edges:,} edges, {len(cg.levels)} levels'
+          f'  (built in {perf_counter() - t:.1f} s; {os.cpu_count()} cpus)')
+    B = inside(cg, REAL); A = outside(cg, REAL, B)
+    base = None
+    for workers in [1, 2, 4, 8, 16]:
+        cg.chunked_levels(workers)
+        b = inside(cg, REAL, workers=workers); a = outside(cg, REAL, b, workers=workers)
+        assert np.array_equal(B, b) and np.array_equal(A, a), 'results differ from the serial path'
+        t_in = timeit(lambda: inside(cg, REAL, workers=workers))
+        t_out = timeit(lambda: outside(cg, REAL, B, workers=workers))
+        if base is None: base = t_in + t_out
+        print(f'  workers={workers:2d}   inside {t_in:7.3f} s   outside {t_out:7.3f} s'
+              f'   speedup {base / (t_in + t_out):5.2f}x')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -1,2 +1,4 @@
 from hypergraphs.hypergraph import Hypergraph, Edge
 from hypergraphs.pcfg import WCFG, PCFG
+from hypergraphs.compiled import CompiledHypergraph
+from hypergraphs.lazy import LazyHypergraph
@@ -0,0 +1,120 @@
+"""Agenda-driven best-first search (Knuth's generalization of Dijkstra's algorithm).
+
+Nodes are popped off a priority queue in order of their best value; a node's
+value is final once popped, and the search stops as soon as the root is
+popped, so only nodes that are at least as good as the root are expanded.
+
+Requires a semiring whose `+` picks the better of its arguments (returning
+one of them, as `MaxPlus` and `MinPlus` do) and whose weights are superior:
+multiplying by an edge weight never improves a value (log-probabilities
+under `MaxPlus`, nonnegative costs under `MinPlus`).
+
+The graph is either a `Hypergraph` or any object with `root`, `kind`,
+`axioms()` (the nullary edges) and `outgoing(x)` (the edges with `x` in their
+body), which may construct edges on demand, so the graph need not be finite.
+"""
+import heapq
+from hypergraphs.hypergraph import Hypergraph
+from hypergraphs.derivation import build
+
+
+class _Item:
+    __slots__ = ('priority', 'value', 'node', 'n')
+
+    def __init__(self, priority, value, node, n):
+        self.priority = priority
+        self.value = value
+        self.node = node
+        self.n = n
+
+    def __lt__(self, other):
+        # `b + a is a` iff `a` is strictly better than `b`; ties go to the
+        # older item.
+        a, b = self.priority, other.priority
+        if (b + a) is a: return True
+        if (a + b) is b: return False
+        return self.n < other.n
+
+
+class _Index:
+    "Adapts a `Hypergraph` to the `axioms`/`outgoing` protocol."
+
+    def __init__(self, g):
+        self.g = g
+        self.root = g.root
+        self.kind = g.kind
+
+    def axioms(self):
+        return (e for e in self.g.edges if not e.body)
+
+    def outgoing(self, x):
+        return self.g.outgoing().get(x, ())
+
+
+class Agenda:
+    """
+    Best-first search for the best derivation of `root`.
+
+    `heuristic(x)`, if given, estimates the value of the best context of `x`
+    (its outside value) and turns the search into A*.  It must never be worse
+    than the true outside value (admissible) and must be consistent: for each
+    edge, `heuristic(b) >= weight * (other bodies) * heuristic(head)` in the
+    order of `+`.  After `run`, `chart` holds the final values of the popped
+    nodes and `pops` counts them.
+    """
+
+    def __init__(self, g, root=None, heuristic=None):
+        if isinstance(g, Hypergraph): g = _Index(g)
+        self.g = g
+        self.root = g.root if root is None else root
+        self.heuristic = heuristic
+        self.chart = {}      # final values
+        self.best = {}       # best value found so far for nodes on the agenda
+        self.bp = {}         # backpointers
+        self.pops = 0
+        self._queue = []
+        self._n = 0
+
+    def _relax(self, e, v):
+        x = e.head
+        if x in self.chart: return
+        old = self.best.get(x)
+        if old is not None and (old + v) is not v: return
+        self.best[x] = v
+        self.bp[x] = e
+        p = v if self.heuristic is None else v * self.heuristic(x)
+        heapq.heappush(self._queue, _Item(p, v, x, self._n))
+        self._n += 1
+
+    def run(self):
+        "Search until the root is popped; returns its value (or None if underivable)."
+        for e in self.g.axioms():
+            self._relax(e, e.weight)
+        chart = self.chart
+        while self._queue:
+            item = heapq.heappop(self._queue)
+            x = item.node
+            if x in chart or item.value is not self.best[x]: continue     # stale
+            chart[x] = item.value
+            del self.best[x]
+            self.pops += 1
+            if x == self.root: return item.value
+            for e in self.g.outgoing(x):
+                if e.head in chart or not all(b in chart for b in e.body): continue
+                v = e.weight
+                for b in e.body:
+                    v *= chart[b]
+                self._relax(e, v)
+
+    def derivation(self, x=None):
+        "Best derivation of `x` (default: root) as nested tuples `(edge, d_1, ..., d_n)`."
+        if x is None: x = self.root
+        assert x in self.chart, x
+        return build(x, lambda x: (self.bp[x], self.bp[x].body))
+
+
+def best_first(g, root=None, heuristic=None):
+    "Value and best derivation of the root of `g`; see `Agenda`."
+    a = Agenda(g, root, heuristic)
+    v = a.run()
+    return v, (a.derivation() if v is not None else None)
@@ -0,0 +1,36 @@
+"""
+CKY parse forest as a hypergraph.
+
+Same recurrence (and callback signatures) as `hypergraphs.apps.parser2.parse`,
+but the edges are stored in a `Hypergraph` rather than summed into a chart.
+"""
+from collections import defaultdict
+from hypergraphs.hypergraph import Hypergraph
+
+
+def cky(sentence, rhs, binary, unary, terminal, root='S', kind=None):
+    "Build the parse forest of `sentence` under the grammar `rhs` (see `parser2.load_grammar`)."
+    n = len(sentence)
+    g = Hypergraph(root=(0, n, root), kind=kind)
+    span = defaultdict(set)
+    for i, w in enumerate(sentence):
+        k = i + 1
+        # Terminal
+        span[i,k].add(w)
+        g.edge(terminal(sentence,w,i), (i,k,w))
+        # Pre-terminal rules
+        for y in set(span[i,k]):
+            for x in rhs[y,]:
+                span[i,k].add(x)
+                g.edge(unary(sentence,x,y,i,k), (i,k,x), (i,k,y))
+    for w in range(2, n+1):
+        for i in range(n-w + 1):
+            k = i + w
+            # fill in cell with binary rules.
+            for j in range(i+1, k):
+                for y in span[i,j]:
+                    for z in span[j,k]:
+                        for x in rhs[y,z]:
+                            span[i,k].add(x)
+                            g.edge(binary(sentence,x,y,z,i,j,k), (i,k,x), (i,j,y), (j,k,z))
+    return g
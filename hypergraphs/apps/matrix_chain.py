@@ -13,17 +13,20 @@ Reference: https://en.wikipedia.org/wiki/Matrix_chain_multiplication
 from hypergraphs import Hypergraph
 
 
-def matrix_chain(dims, W):
+def matrix_chain(dims, W, fuse=False):
     """Build the matrix-chain hypergraph for matrices with the given
     dimensions, weighted in the semiring ``W``.
 
     ``dims`` is a dimension sequence with $M_i$ having shape
     ``dims[i] x dims[i+1]``. ``W`` is a semiring class exposing
     ``W.one`` and ``W.lift(value, provenance)``. The returned hypergraph
-    is rooted at ``(0, N-1)`` where ``N = len(dims) - 1``.
+    is rooted at ``(0, N-1)`` where ``N = len(dims) - 1``.  Edges are
+    added bottom up, so ``fuse=True`` (see ``Hypergraph.fuse``) computes the
+    inside chart during construction.
     """
     N = len(dims) - 1
     g = Hypergraph(root=(0, N-1))
+    if fuse: g.fuse()
     for i in range(N):
         g.edge(W.one, (i, i))
     for span in range(1, N):
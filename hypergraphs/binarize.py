@@ -0,0 +1,125 @@
+"""Binarization of hyperedges with more than two body nodes.
+
+An edge `h <- w * b_0 * ... * b_{n-1}` is replaced by a chain of binary
+edges through intermediate nodes `Span(body)`, each standing for the product
+of a contiguous run of the original body (in order, so non-commutative
+semirings are fine).  The chain grows the run one node at a time:
+
+    left     (b_0 b_1), ((b_0 b_1) b_2), ...           shared prefixes
+    right    (b_{n-2} b_{n-1}), (b_{n-3} (...)), ...   shared suffixes
+    head     from the head child `b_k` rightwards, then leftwards
+
+The original weight goes on the last edge, into `h`; the others have weight
+`one`.  Intermediate nodes are keyed by their run of body nodes, so edges
+with a common prefix (suffix, ...) share them, and each gets exactly one
+incoming edge, so derivations of the binarized graph correspond one-to-one
+to derivations of the original.
+"""
+from collections import namedtuple
+
+from hypergraphs.hypergraph import Hypergraph
+from hypergraphs.derivation import build
+
+
+Span = namedtuple('Span', 'body')
+Span.__doc__ = 'Intermediate node: the product of the nodes `body`, in order.'
+
+
+class Binarized(Hypergraph):
+    """
+    A binarized hypergraph.  `origin[i]` is the position in `source.edges` of
+    the edge that `edges[i]` replaces, or None for edges into a `Span`.
+    """
+
+    def __init__(self, source):
+        super().__init__(source.root, source.kind)
+        self.source = source
+        self.origin = []
+
+    def to_source(self, values, zero=0.0):
+        """
+        Per-edge `values` of this graph (e.g. marginals from `grad(log=True)`)
+        as a list aligned with `source.edges`.
+        """
+        out = [zero] * len(self.source.edges)
+        for j, v in zip(self.origin, values):
+            if j is not None: out[j] = v
+        return out
+
+    def unbinarize(self, d):
+        """
+        Map a derivation `(edge, d_1, ..., d_k)` of this graph to the
+        corresponding derivation of `source`.
+        """
+        edges = self.source.edges
+        index = self._index()
+        def expand(d):
+            # The original edge, and the derivations below it, found by
+            # flattening the `Span` subtrees in order.
+            e, *ds = d
+            children = []
+            stack = ds[::-1]
+            while stack:
+                c = stack.pop()
+                if isinstance(c[0].head, Span): stack.extend(c[:0:-1])
+                else: children.append(c)
+            return edges[index[id(e)]], children
+        return build(d, expand)
+
+    def _index(self):
+        if 'origin' not in self._cache:
+            self._cache['origin'] = {id(e): j for e, j in zip(self.edges, self.origin)}
+        return self._cache['origin']
+
+
+def binarize(g, direction='left', head=None):
+    """
+    Binarize `g` (see module docstring); returns a `Binarized`.  For
+    `direction='head'`, `head(edge)` gives the position of the head child in
+    `edge.body`.
+    """
+    assert direction in ('left', 'right', 'head'), direction
+    assert direction != 'head' or head is not None, "direction='head' needs head(edge)"
+    H = Binarized(g)
+    one = g.kind.one
+    spans = set()
+    for j, e in enumerate(g.edges):
+        n = len(e.body)
+        if n <= 2:
+            H.edge(e.weight, e.head, *e.body)
+            H.origin.append(j)
+            continue
+        body = e.body
+        def node(i, k):
+            return body[i] if k - i == 1 else Span(body[i:k])
+        i, k = _start(direction, n, head, e)
+        for step in _steps(direction, n, i):
+            ii, kk = (i, k + 1) if step > 0 else (i - 1, k)
+            rhs = (node(i, k), body[k]) if step > 0 else (body[i-1], node(i, k))
+            i, k = ii, kk
+            if (i, k) == (0, n):
+                H.edge(e.weight, e.head, *rhs)
+                H.origin.append(j)
+            else:
+                x = node(i, k)
+                if x not in spans:
+                    spans.add(x)
+                    H.edge(one, x, *rhs)
+                    H.origin.append(None)
+    return H
+
+
+def _start(direction, n, head, e):
+    "The first run, a single body node."
+    if direction == 'left': return 0, 1
+    if direction == 'right': return n - 1, n
+    h = head(e)
+    assert 0 <= h < n, h
+    return h, h + 1
+
+
+def _steps(direction, n, i):
+    "+1 to extend the run to the right, -1 to the left."
+    if direction == 'left': return [+1] * (n - 1)
+    if direction == 'right': return [-1] * (n - 1)
+    return [+1] * (n - 1 - i) + [-1] * i
@@ -18,10 +18,10 @@ class NodeRef:
         self.key = key
 
     def __mul__(self, other):
-        return _Product._build(self, other)
+        return _Product(self, other)
 
     def __rmul__(self, other):
-        return _Product._build(other, self)
+        return _Product(other, self)
 
     def __iadd__(self, other):
         self.graph._append_edge(self.key, other)
@@ -32,23 +32,40 @@ class NodeRef:
 
 
 class _Product:
-    """Flattened product expression accumulated by `NodeRef.__mul__`."""
-    __slots__ = ('factors',)
+    """Product expression built by `NodeRef.__mul__`.
 
-    def __init__(self, factors):
-        self.factors = factors
+    A binary tree: each `*` allocates one node in O(1), instead of copying the
+    factors so far, and `_normalize` reads the factors off in order.
+    """
+    __slots__ = ('left', 'right')
 
-    @staticmethod
-    def _build(a, b):
-        fa = a.factors if isinstance(a, _Product) else [a]
-        fb = b.factors if isinstance(b, _Product) else [b]
-        return _Product(fa + fb)
+    def __init__(self, left, right):
+        self.left = left
+        self.right = right
 
     def __mul__(self, other):
-        return _Product._build(self, other)
+        return _Product(self, other)
 
     def __rmul__(self, other):
-        return _Product._build(other, self)
+        return _Product(other, self)
+
+    @property
+    def factors(self):
+        "The factors, left to right."
+        # Walk down the left spine of `a * b * c * ...`, the usual shape;
+        # parenthesized products on the right are expanded recursively.
+        out = []
+        p = self
+        while isinstance(p, _Product):
+            r = p.right
+            if isinstance(r, _Product):
+                out.extend(reversed(r.factors))
+            else:
+                out.append(r)
+            p = p.left
+        out.append(p)
+        out.reverse()
+        return out
 
 
 class HypergraphBuilder(Hypergraph):
@@ -62,6 +79,14 @@ class HypergraphBuilder(Hypergraph):
     Scalars inside a product are multiplied together (left-to-right) and
     become the edge's weight. `NodeRef` factors become the edge's body, in
     order. If no scalar appears, weight defaults to `kind.one`.
+
+    The sugar is not free: every `g[x]` allocates a `NodeRef` and every `*` a
+    `_Product` node, and there is no allocation-free fast path for it.
+    `bench/builder.py` measures it at about 2x slower than `edge()` (best of
+    three runs on a collected heap; single cold runs, where garbage collection
+    dominates, have shown 3-6x), while `add_edges` from arrays is 5-25% faster
+    than `edge()`.  Use `edge()`, or `add_edges` for edges already in arrays, on
+    hot paths.
     """
 
     def __init__(self, kind, root=None):
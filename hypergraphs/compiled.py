@@ -0,0 +1,351 @@
+"""Frozen, array-backed form of a `Hypergraph`.
+
+`Hypergraph.compile()` interns node keys to dense integer ids, numbered in
+topological order (every edge's body precedes its head), and stores the edges
+as a structure of read-only arrays:
+
+    head[e]                                  head node of edge e
+    body[body_ptr[e]:body_ptr[e+1]]          body nodes of edge e, in order
+    in_edge[in_ptr[v]:in_ptr[v+1]]           edges with head v
+    weight[e]                                weight of edge e
+
+Edge ids agree with positions in `Hypergraph.edges`.  Charts are dense lists
+indexed by node id; `CompiledHypergraph.to_chart` keys them by node.
+"""
+import numpy as np
+from copy import copy
+
+from hypergraphs.hypergraph import _holes
+
+
+class CompiledHypergraph:
+
+    def __init__(self, nodes, head, body_ptr, body, weight, root, kind, in_edge=None, in_ptr=None):
+        self.nodes = nodes
+        self.head = head
+        self.body_ptr = body_ptr
+        self.body = body
+        self.weight = weight
+        self.root = root
+        self.kind = kind
+        V = len(nodes)
+        if in_edge is None:
+            in_edge = np.argsort(head, kind='stable')
+            in_ptr = np.zeros(V+1, dtype=np.int64)
+            np.cumsum(np.bincount(head, minlength=V), out=in_ptr[1:])
+        self.in_edge = in_edge
+        self.in_ptr = in_ptr
+        for a in (head, body_ptr, body, weight, self.in_edge, self.in_ptr):
+            a.setflags(write=False)
+        self.base = None             # the graph that a `with_weights` view shares its topology with
+        self._lowered = {}
+        self._derived = {}           # structures derived from the topology; shared with views
+
+    @classmethod
+    def from_hypergraph(cls, g, dtype=None):
+        "Intern `g`'s nodes and pack its edges; `dtype=None` keeps the weights as objects."
+        keys, head, body_ptr, body, root = _intern(g)
+        weights = (e.weight for e in g.edges)
+        weight = np.fromiter(weights, dtype=object if dtype is None else dtype, count=len(g.edges))
+        return cls.from_arrays(keys, head, body_ptr, body, weight, root, g.kind)
+
+    @classmethod
+    def from_arrays(cls, nodes, head, body_ptr, body, weight, root, kind):
+        """
+        Compile edges given as arrays over node ids `0..len(nodes)-1` in any
+        order (e.g. from `_intern`); the nodes are renumbered topologically.
+        """
+        # Renumber the nodes so that ids are a topological order.
+        order = _topological(len(nodes), head, body_ptr, body)
+        rank = np.empty(len(nodes), dtype=np.int32)
+        rank[order] = np.arange(len(nodes), dtype=np.int32)
+        return cls(
+            nodes = [nodes[i] for i in order.tolist()],
+            head = rank[head],
+            body_ptr = body_ptr,
+            body = rank[body],
+            weight = weight,
+            root = None if root is None else int(rank[root]),
+            kind = kind,
+        )
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.kind.__name__}, nodes={self.num_nodes}, edges={self.num_edges})'
+
+    @property
+    def num_nodes(self):
+        return len(self.nodes)
+
+    @property
+    def num_edges(self):
+        return len(self.head)
+
+    @property
+    def arity(self):
+        return np.diff(self.body_ptr)
+
+    @property
+    def nbytes(self):
+        "Bytes used by the edge arrays (excludes the node table)."
+        return sum(a.nbytes for a in (self.head, self.body_ptr, self.body, self.weight,
+                                      self.in_edge, self.in_ptr))
+
+    def _cached(self, key, build):
+        if key not in self._derived:
+            self._derived[key] = build()
+        return self._derived[key]
+
+    @property
+    def index(self):
+        "Map from node key to node id."
+        return self._cached('index', lambda: {x: i for i, x in enumerate(self.nodes)})
+
+    @property
+    def _lists(self):
+        # Python-list copies of the arrays; indexing lists is much faster than
+        # indexing numpy arrays one scalar at a time.
+        return self._cached('lists', lambda: (self.head.tolist(), self.body_ptr.tolist(), self.body.tolist(),
+                                              self.in_ptr.tolist(), self.in_edge.tolist()))
+
+    @property
+    def levels(self):
+        "Edges grouped by the topological level of their head (see `hypergraphs.vectorized`)."
+        from hypergraphs.vectorized import levels
+        return self._cached('levels', lambda: levels(self))
+
+    def with_weights(self, weight, kind=None, semiring=None):
+        """
+        A view with the same topology and other edge weights, aligned with the
+        edges.  The node table, edge arrays and structures derived from them
+        (levels, index), including those computed later, are shared with
+        `self`, not copied.  `weight` holds values of `kind` (by default
+        `self.kind`), or, with a vectorized `semiring`, numbers in it.
+        """
+        view = copy(self)
+        view.base = self if self.base is None else self.base
+        view.kind = self.kind if kind is None else kind
+        view._set_weights(weight, semiring)
+        return view
+
+    def set_weights(self, weight, semiring=None):
+        """
+        Replace the edge weights of a view from `with_weights` in place (O(E),
+        the topology is untouched).  Not allowed on other compiled graphs:
+        `Hypergraph.compile()` is cached and must agree with the graph's edges.
+        """
+        assert self.base is not None, 'set_weights is only for views; use with_weights'
+        self._set_weights(weight, semiring)
+
+    def _set_weights(self, weight, semiring):
+        dtype = self.weight.dtype if semiring is None else semiring.dtype
+        w = np.fromiter(weight, dtype=dtype, count=self.num_edges)
+        w.setflags(write=False)
+        self.weight = w
+        self._lowered = {} if semiring is None else {semiring.name: w}
+
+    def save(self, path, **charts):
+        "Write to `path` in the format of `hypergraphs.storage`, with optional chart arrays."
+        from hypergraphs.storage import save
+        save(self, path, **charts)
+
+    @classmethod
+    def load(cls, path, mmap=True, lift=False):
+        "Read a file written by `save`; returns `(cg, charts)`.  See `hypergraphs.storage.load`."
+        from hypergraphs.storage import load
+        return load(path, mmap=mmap, lift=lift)
+
+    def chunked_levels(self, workers):
+        "`levels`, each split into at most `workers` chunks for threads (cached)."
+        from hypergraphs.vectorized import chunks, MIN_CHUNK
+        key = (workers, MIN_CHUNK)
+        return self._cached(('chunked', key), lambda: [chunks(self, level, workers) for level in self.levels])
+
+    def lower(self, S):
+        "Edge weights as an array in the scalar semiring `S` (cached)."
+        if S.name not in self._lowered:
+            w = np.fromiter(map(S.lower, self.weight), dtype=S.dtype, count=self.num_edges)
+            w.setflags(write=False)
+            self._lowered[S.name] = w
+        return self._lowered[S.name]
+
+    def to_chart(self, values):
+        "Key a dense chart by node."
+        C = self.kind.chart()
+        for x, v in zip(self.nodes, values):
+            C[x] = v
+        return C
+
+    def Z(self, weight=None):
+        "Evaluate the partition function (total score of root node)."
+        return self.inside(weight)[self.root]
+
+    def inside(self, weight=None):
+        "Run inside algorithm; `weight` optionally overrides the edge weights."
+        w = self.weight if weight is None else weight
+        zero = self.kind.zero; one = self.kind.one
+        _, body_ptr, body, in_ptr, in_edge = self._lists
+        B = [zero] * self.num_nodes
+        for x in range(self.num_nodes):
+            for e in in_edge[in_ptr[x]:in_ptr[x+1]]:
+                v = one
+                for b in body[body_ptr[e]:body_ptr[e+1]]:
+                    v *= B[b]
+                B[x] += w[e] * v
+        return B
+
+    def outside(self, B, weight=None):
+        "Run outside algorithm given the inside chart `B`; see `Hypergraph.outside`."
+        w = self.weight if weight is None else weight
+        zero = self.kind.zero; one = self.kind.one
+        _, body_ptr, body, in_ptr, in_edge = self._lists
+        A = [zero] * self.num_nodes
+        A[self.root] = one
+        for x in reversed(range(self.num_nodes)):
+            for e in in_edge[in_ptr[x]:in_ptr[x+1]]:
+                ys = body[body_ptr[e]:body_ptr[e+1]]
+                for y, v in zip(ys, _holes(one, w[e], A[x], [B[y] for y in ys])):
+                    A[y] += v
+        return A
+
+    def insideout(self, B, A, X, zero):
+        """Inside-outside speedup; see `Hypergraph.insideout`.
+
+        Here `X` is called with the edge id rather than the `Edge`.
+        """
+        head, body_ptr, body, _, _ = self._lists
+        xhat = zero
+        for e in range(self.num_edges):
+            kbar = A[head[e]]
+            for b in body[body_ptr[e]:body_ptr[e+1]]:
+                kbar *= B[b]
+            xhat = xhat + X(e) * kbar
+        return B[self.root], xhat
+
+    def prune_mask(self):
+        """
+        Boolean masks `(nodes, edges)` of the nodes and edges that appear in
+        some derivation of the root, in O(V+E).
+
+        A node is derivable if one of its edges has only derivable body nodes
+        (bottom up); an edge is kept if it is derivable in this sense and its
+        head is reachable from the root through such edges (top down).
+        """
+        head, body_ptr, body, in_ptr, in_edge = self._lists
+        V = self.num_nodes
+        derivable = [False] * V
+        ok = [False] * self.num_edges
+        for x in range(V):
+            for e in in_edge[in_ptr[x]:in_ptr[x+1]]:
+                if all(derivable[b] for b in body[body_ptr[e]:body_ptr[e+1]]):
+                    ok[e] = derivable[x] = True
+        reach = [False] * V
+        if self.root is not None: reach[self.root] = derivable[self.root]
+        for x in reversed(range(V)):
+            if not reach[x]: continue
+            for e in in_edge[in_ptr[x]:in_ptr[x+1]]:
+                if ok[e]:
+                    for b in body[body_ptr[e]:body_ptr[e+1]]:
+                        reach[b] = True
+        reach = np.array(reach, dtype=bool)
+        return reach, reach[self.head] & np.array(ok, dtype=bool)
+
+    def prune_topo(self):
+        """
+        Eliminate nodes/edges which don't feed into any valid derivations of
+        the root node.
+        """
+        return self.subgraph(self.prune_mask()[1])
+
+    def subgraph(self, keep):
+        "Restrict to the edges in the boolean mask `keep` (and the nodes they mention)."
+        used = np.zeros(self.num_nodes, dtype=bool)
+        used[self.head[keep]] = True
+        starts = self.body_ptr[:-1][keep]; arity = self.arity[keep]
+        items = _segment_index(starts, arity)
+        used[self.body[items]] = True
+        if self.root is not None: used[self.root] = True
+        rank = np.cumsum(used, dtype=np.int32) - 1
+        body_ptr = np.zeros(len(arity)+1, dtype=np.int64)
+        np.cumsum(arity, out=body_ptr[1:])
+        return self.__class__(
+            nodes = [x for x, u in zip(self.nodes, used.tolist()) if u],
+            head = rank[self.head[keep]],
+            body_ptr = body_ptr,
+            body = rank[self.body[items]],
+            weight = self.weight[keep],
+            root = None if self.root is None else int(rank[self.root]),
+            kind = self.kind,
+        )
+
+    def hypergraph(self, cls=None):
+        "Decompile into a `Hypergraph` (or an instance of `cls`)."
+        if cls is None:
+            from hypergraphs.hypergraph import Hypergraph as cls
+        head, body_ptr, body, _, _ = self._lists
+        H = cls(None if self.root is None else self.nodes[self.root], self.kind)
+        nodes = self.nodes
+        for e, w in enumerate(self.weight):
+            H.edge(w, nodes[head[e]], *[nodes[b] for b in body[body_ptr[e]:body_ptr[e+1]]])
+        return H
+
+
+def _intern(g):
+    """
+    `(keys, head, body_ptr, body, root)`: `g`'s edges as arrays over node ids
+    numbered in order of first appearance, where `keys[i]` is node `i`.
+    """
+    index = {}
+    head = []
+    body = []
+    arity = []
+    for e in g.edges:
+        head.append(index.setdefault(e.head, len(index)))
+        for b in e.body:
+            body.append(index.setdefault(b, len(index)))
+        arity.append(len(e.body))
+    root = None if g.root is None else index.setdefault(g.root, len(index))
+    body_ptr = np.zeros(len(arity)+1, dtype=np.int64)
+    np.cumsum(arity, out=body_ptr[1:])
+    return list(index), np.array(head, dtype=np.int32), body_ptr, np.array(body, dtype=np.int32), root
+
+
+def _segment_index(starts, lengths):
+    "Concatenation of `range(s, s+n)` for each `s, n` in `zip(starts, lengths)`."
+    ends = np.cumsum(lengths)
+    return np.repeat(starts - ends + lengths, lengths) + np.arange(ends[-1] if len(ends) else 0)
+
+
+def _topological(num_nodes, head, body_ptr, body):
+    """
+    Order the nodes so that every edge's body precedes its head (Kahn's
+    algorithm, generalized to hyperedges): an edge fires once all of its body
+    nodes are done, and a node is done once all of its edges have fired.
+    """
+    num_edges = len(head)
+    arity = np.diff(body_ptr)
+    need = arity.tolist()                                   # unfinished body items per edge
+    waiting = np.bincount(head, minlength=num_nodes).tolist()  # unfired edges per node
+    # Occurrences of each node in edge bodies.
+    occ = np.repeat(np.arange(num_edges), arity)[np.argsort(body, kind='stable')].tolist()
+    occ_ptr = np.zeros(num_nodes+1, dtype=np.int64)
+    np.cumsum(np.bincount(body, minlength=num_nodes), out=occ_ptr[1:])
+    occ_ptr = occ_ptr.tolist()
+    head = head.tolist()
+
+    order = [x for x in range(num_nodes) if waiting[x] == 0]
+    for e in range(num_edges):
+        if need[e] == 0:
+            h = head[e]
+            waiting[h] -= 1
+            if waiting[h] == 0: order.append(h)
+    i = 0
+    while i < len(order):
+        x = order[i]; i += 1
+        for e in occ[occ_ptr[x]:occ_ptr[x+1]]:
+            need[e] -= 1
+            if need[e] == 0:
+                h = head[e]
+                waiting[h] -= 1
+                if waiting[h] == 0: order.append(h)
+    assert len(order) == num_nodes, 'hypergraph has a cycle'
+    return np.array(order, dtype=np.int64)
@@ -0,0 +1,239 @@
+"""Shrinking a forest before inference.
+
+`compress` rewrites the part of a hypergraph reachable from its root with
+three reductions, each of which preserves the inside value of every node
+that survives:
+
+  - hash-consing (optional): nodes whose incoming edges are identical (same
+    weights, and bodies that are identical after hash-consing) have the same
+    inside value; all but one of them are dropped and their uses point to
+    the survivor.
+  - unary-chain contraction: if a unary edge `x <- u * y` is the only use of
+    a node `y` that has a single incoming edge `y <- v * body`, the two
+    become `x <- (u * v) * body` and `y` is dropped.  Chains collapse into
+    one edge.
+  - parallel-edge merging: edges with the same head and body become one
+    edge whose weight is the sum of theirs.  This merges derivations, so it
+    is on by default only for the real, log, max/min-plus and boolean
+    semirings.
+
+Each edge of the result records its provenance in `origin`: the position of
+a source edge, `Chain(outer, inner)` for a contracted pair or
+`Merge(parts)` for merged edges, with `parts` a tuple of `(origin,
+weight)`.  `Compressed.expand` maps a derivation back to the source, and
+`Compressed.to_source` maps edge marginals back (splitting merged edges in
+proportion to their weight and hash-consed nodes in proportion to their
+expected count).
+"""
+import numpy as np
+from collections import Counter, defaultdict, namedtuple
+
+from hypergraphs.hypergraph import Hypergraph
+from hypergraphs.derivation import build
+
+
+Chain = namedtuple('Chain', 'outer, inner')
+Merge = namedtuple('Merge', 'parts')
+
+
+class Compressed(Hypergraph):
+    """
+    The result of `compress`.  `origin[i]` is the provenance of `edges[i]`,
+    `canonical` maps each hash-consed source node to its survivor, and
+    `stats` counts nodes and edges before and after.
+    """
+
+    def __init__(self, source):
+        super().__init__(source.root, source.kind)
+        self.source = source
+        self.origin = []
+        self.canonical = {}
+        self.twins = {}              # (node, edge id into its survivor) -> its own edge id
+        self.stats = {}
+
+    @property
+    def ratio(self):
+        "Edges after compression over edges before."
+        return self.stats['edges'][1] / max(self.stats['edges'][0], 1)
+
+    def report(self):
+        s = self.stats
+        return (f'compress: {s["nodes"][0]} -> {s["nodes"][1]} nodes, {s["edges"][0]} -> {s["edges"][1]} edges'
+                f' ({self.ratio:.1%}); {s["hashconsed"]} nodes hash-consed, {s["contracted"]} unary'
+                f' edges contracted, {s["merged"]} parallel edges merged')
+
+    def _resolve(self, j, y):
+        "The edge into source node `y` that corresponds to source edge `j`."
+        return j if self.source.edges[j].head == y else self.twins[y, j]
+
+    def expand(self, d, node=None):
+        """
+        Map a derivation `(edge, d_1, ..., d_k)` of this graph to the
+        corresponding derivation of `source`, rooted at the source node `node`
+        (default: the root).
+        """
+        index = self._index()
+        edges = self.source.edges
+        # Items are `(chain, i, y, ds)`: source edge `chain[i]` at node `y`,
+        # where `chain` lists a contracted edge's source edges top down and
+        # `ds` are the subderivations below its last one.
+        def item(d, y):
+            e, *ds = d
+            prov = self.origin[index[id(e)]]
+            if isinstance(prov, Merge): prov = _chosen(prov, e.weight)
+            return (_unchain(prov), 0, y, ds)
+        def expand(it):
+            chain, i, y, ds = it
+            es = edges[self._resolve(chain[i], y)]
+            if i + 1 < len(chain):
+                return es, [(chain, i + 1, es.body[0], ds)]
+            return es, [item(c, b) for c, b in zip(ds, es.body)]
+        return build(item(d, self.root if node is None else node), expand)
+
+    def to_source(self, m):
+        """
+        Map per-edge marginals `m` of this graph (e.g. from `grad(log=True)`)
+        to an array aligned with `source.edges`.  Needs real or log weights.
+        """
+        from hypergraphs import vectorized
+        S = vectorized.scalar_semiring(self.kind)
+        assert S in (vectorized.REAL, vectorized.LOG), f'to_source needs real weights, not {self.kind}'
+        log = (np.log if S is vectorized.REAL else lambda x: x)
+        m = np.asarray(m, dtype=float)
+        src = self.source
+        # Conditional probability of each source edge given its head.
+        mu = defaultdict(float)
+        for e, v in zip(self.edges, m.tolist()):
+            mu[e.head] += v
+        p = np.zeros(len(src.edges))
+        twins = defaultdict(list)
+        for (_, j), k in self.twins.items():
+            twins[j].append(k)
+        for e, prov, v in zip(self.edges, self.origin, m.tolist()):
+            stack = [(prov, v / mu[e.head] if mu[e.head] else 0.0)]
+            while stack:
+                prov, q = stack.pop()
+                if isinstance(prov, Chain):
+                    stack.append((prov.outer, q)); stack.append((prov.inner, 1.0))
+                elif isinstance(prov, Merge):
+                    with np.errstate(divide='ignore'):
+                        lw = np.array([log(S.lower(w)) for _, w in prov.parts])
+                    share = np.exp(lw - np.logaddexp.reduce(lw))
+                    stack.extend((part, q * s) for (part, _), s in zip(prov.parts, share.tolist()))
+                else:
+                    p[prov] = q
+                    for k in twins[prov]: p[k] = q
+        # Expected count of each source node, top down.
+        index = {id(e): j for j, e in enumerate(src.edges)}
+        count = defaultdict(float)
+        count[src.root] = mu[src.root]
+        out = np.zeros(len(src.edges))
+        for y in reversed(src.toposort()):
+            for e in src.incoming[y]:
+                j = index[id(e)]
+                out[j] = count[y] * p[j]
+                for b in e.body:
+                    count[b] += out[j]
+        return out
+
+    def _index(self):
+        if 'origin' not in self._cache:
+            self._cache['origin'] = {id(e): i for i, e in enumerate(self.edges)}
+        return self._cache['origin']
+
+
+def _unchain(prov):
+    "The source edges of a (possibly contracted) provenance, top down."
+    out = []
+    stack = [prov]
+    while stack:
+        p = stack.pop()
+        if isinstance(p, Chain):
+            stack.append(p.inner); stack.append(p.outer)
+        else:
+            out.append(p)
+    return out
+
+
+def _chosen(prov, w):
+    "The part of a merged edge that attains the merged weight `w` (selective semirings)."
+    for part, v in prov.parts:
+        if v is w: return part
+    for part, v in prov.parts:
+        if v == w: return part
+    return prov.parts[0][0]
+
+
+def compress(g, hashcons=False, merge=None, verbose=0):
+    "Compress `g`; see the module docstring.  Returns a `Compressed`."
+    from hypergraphs import vectorized
+    if merge is None: merge = vectorized.scalar_semiring(g.kind) is not None
+    H = Compressed(g)
+    index = {id(e): j for j, e in enumerate(g.edges)}
+    order = g.toposort()
+    canonical = H.canonical
+    # Hash-consing: working edges are [weight, head, body, origin].
+    work = defaultdict(list)
+    seen = {}
+    for x in order:
+        es = [(e.weight, tuple(canonical.get(b, b) for b in e.body), index[id(e)]) for e in g.incoming[x]]
+        if hashcons and x != g.root:
+            try:
+                sig = frozenset(Counter((w, body) for w, body, _ in es).items())
+                y = seen.setdefault(sig, x)
+            except TypeError:         # unhashable weights
+                y = x
+            if y != x:
+                canonical[x] = y
+                # Pair up x's edges with the survivor's, by (weight, body).
+                groups = defaultdict(list)
+                for w, body, j in es: groups[w, body].append(j)
+                for w, _, body, k in work[y]:
+                    H.twins[x, k] = groups[w, body].pop()
+                continue
+        work[x] = [[w, x, body, j] for w, body, j in es]
+    kept = [x for x in order if x not in canonical]
+    # Unary-chain contraction, bottom up.
+    uses = Counter(b for x in kept for E in work[x] for b in E[2])
+    dropped = set()
+    contracted = 0
+    for x in kept:
+        for E in work[x]:
+            while len(E[2]) == 1:
+                y = E[2][0]
+                if y == g.root or uses[y] != 1 or len(work.get(y, ())) != 1: break
+                [P] = work[y]
+                E[0] = E[0] * P[0]; E[2] = P[2]; E[3] = Chain(E[3], P[3])
+                dropped.add(y)
+                contracted += 1
+    # Parallel-edge merging.
+    merged = 0
+    for x in kept:
+        if x in dropped: continue
+        if merge:
+            groups = {}
+            for E in work[x]:
+                groups.setdefault(E[2], []).append(E)
+            for body, Es in groups.items():
+                if len(Es) > 1:
+                    w = Es[0][0]
+                    for E in Es[1:]: w = w + E[0]
+                    Es = [[w, x, body, Merge(tuple((E[3], E[0]) for E in Es))]]
+                    merged += len(groups[body]) - 1
+                for w, _, body, prov in Es:
+                    H.edge(w, x, *body)
+                    H.origin.append(prov)
+        else:
+            for w, _, body, prov in work[x]:
+                H.edge(w, x, *body)
+                H.origin.append(prov)
+    before_nodes = len(order)
+    H.stats = dict(
+        nodes = (before_nodes, before_nodes - len(canonical) - len(dropped)),
+        edges = (sum(len(g.incoming[x]) for x in order), len(H.edges)),
+        hashconsed = len(canonical),
+        contracted = contracted,
+        merged = merged,
+    )
+    if verbose: print(H.report())
+    return H
@@ -0,0 +1,188 @@
+"""Inference over a corpus of hypergraphs on a process pool.
+
+Each hypergraph is shipped to a worker in a compact form: its edge arrays
+over interned node ids and the log edge weights (no node keys, no `Edge`
+objects); the worker compiles them.  Edges can be labeled by `key(edge)`,
+e.g. the grammar rule; labels are interned to integers before shipping, and
+workers send back only the nonzero totals per label.  Instead of a hypergraph, an item may be a picklable zero-argument
+callable that builds one, in which case the building (and `key`) runs in
+the worker.
+
+Results come back in input order.  At most `window` items are in flight at
+once, so a long (or infinite) stream of inputs is consumed only as fast as
+results are taken.  `processes=0` runs everything in the calling process.
+
+Weights must be real (`Float`) or `LogVal`; everything is computed in the log
+semiring with `hypergraphs.vectorized`.
+"""
+import numpy as np
+from collections import Counter, deque
+
+
+def _pack(g, labels=None):
+    """
+    Compact, picklable form of `g`: its edges as arrays over interned node
+    ids, and log-weights.  The topological renumbering of `g.compile()` is
+    left to `_unpack`, in the worker.
+    """
+    from hypergraphs import vectorized
+    from hypergraphs.compiled import _intern
+    S = vectorized.scalar_semiring(g.kind)
+    assert S in (vectorized.REAL, vectorized.LOG), f'need real weights, not {g.kind}'
+    keys, head, body_ptr, body, root = _intern(g)
+    theta = np.fromiter((S.lower(e.weight) for e in g.edges), dtype=S.dtype, count=len(g.edges))
+    if S is vectorized.REAL:
+        with np.errstate(divide='ignore'):
+            theta = np.log(theta)
+    return (len(keys), head, body_ptr, body, root, theta, labels)
+
+
+def _unpack(packed):
+    from hypergraphs.compiled import CompiledHypergraph
+    V, head, body_ptr, body, root, theta, labels = packed
+    return CompiledHypergraph.from_arrays(range(V), head, body_ptr, body, theta, root, None), theta, labels
+
+
+class _Interner:
+    "Maps `key(edge)` to dense integer labels."
+
+    def __init__(self, key):
+        self.key = key
+        self.index = {}
+        self.keys = []
+
+    def __call__(self, g):
+        labels = np.empty(len(g.edges), dtype=np.int64)
+        for i, e in enumerate(g.edges):
+            k = self.key(e)
+            j = self.index.get(k)
+            if j is None:
+                j = self.index[k] = len(self.keys)
+                self.keys.append(k)
+            labels[i] = j
+        return labels
+
+
+def _prepare(item, interner, key):
+    """
+    What is sent to a worker for `item`: a packed hypergraph, or the builder
+    itself along with `key` (which then has to be picklable).
+    """
+    if callable(item): return item, key
+    return _pack(item, None if interner is None else interner(item)), None
+
+
+def _load(job, key):
+    if callable(job):
+        g = job()
+        labels = None if key is None else [key(e) for e in g.edges]
+        return _unpack(_pack(g, labels))
+    return _unpack(job)
+
+
+def _inside_task(job, key, chart):
+    from hypergraphs.vectorized import inside, LOG
+    cg, theta, _ = _load(job, key)
+    B = inside(cg, LOG, theta)
+    return B if chart else float(B[cg.root])
+
+
+def _sum_product_task(job, key):
+    from hypergraphs.vectorized import log_marginals
+    cg, theta, labels = _load(job, key)
+    logm, logZ = log_marginals(cg, theta)
+    m = np.exp(logm - logZ)
+    logZ = float(logZ)
+    if labels is None:
+        return logZ, m
+    if isinstance(labels, np.ndarray):     # interned by the parent
+        c = np.bincount(labels, weights=m)
+        nz = np.flatnonzero(c)
+        return logZ, (nz, c[nz])
+    counts = Counter()
+    for k, v in zip(labels, m.tolist()):
+        counts[k] += v
+    return logZ, counts
+
+
+def _counts_task(jobs):
+    """
+    Total log Z and expected counts over several graphs: by interned label,
+    and by key for graphs built in the worker.
+    """
+    total = 0.0
+    interned = Counter(); counts = Counter()
+    for job, key in jobs:
+        logZ, c = _sum_product_task(job, key)
+        total += logZ
+        if isinstance(c, tuple):
+            for j, v in zip(c[0].tolist(), c[1].tolist()): interned[j] += v
+        else:
+            counts.update(c)
+    return total, interned, counts
+
+
+def _imap(func, args, processes, window):
+    "Ordered `func(*a) for a in args` on a process pool with at most `window` pending tasks."
+    if processes == 0:
+        for a in args:
+            yield func(*a)
+        return
+    from os import cpu_count
+    from multiprocessing import Pool
+    with Pool(processes) as pool:
+        if window is None: window = 2 * (processes or cpu_count())
+        pending = deque()
+        for a in args:
+            if len(pending) >= window:
+                yield pending.popleft().get()
+            pending.append(pool.apply_async(func, a))
+        while pending:
+            yield pending.popleft().get()
+
+
+def map_inside(graphs, processes=None, window=None, chart=False):
+    """
+    Generate log Z of each hypergraph in `graphs` (or, with `chart=True`, its
+    log inside chart, indexed by the node ids of `g.compile()`), in order.
+    """
+    return _imap(_inside_task, ((*_prepare(g, None, None), chart) for g in graphs), processes, window)
+
+
+def imap_sum_product(graphs, key=None, processes=None, window=None):
+    """
+    Generate `(log Z, counts)` for each hypergraph in `graphs`, in order, where
+    `counts` maps `key(edge)` to the expected number of uses of edges with
+    that key; without `key`, it is the array of edge marginals.
+    """
+    interner = None if key is None else _Interner(key)
+    jobs = (_prepare(g, interner, key) for g in graphs)
+    for logZ, c in _imap(_sum_product_task, jobs, processes, window):
+        if isinstance(c, tuple):
+            c = Counter({interner.keys[j]: v for j, v in zip(c[0].tolist(), c[1].tolist())})
+        yield logZ, c
+
+
+def expected_counts(graphs, key, processes=None, window=None, batch=64):
+    """
+    Total log-likelihood and expected counts of `key(edge)` summed over the
+    corpus.  Workers sum over `batch` graphs at a time, so one `Counter` per
+    batch crosses process boundaries.
+    """
+    interner = _Interner(key)
+    def batches():
+        b = []
+        for g in graphs:
+            b.append(_prepare(g, interner, key))
+            if len(b) == batch:
+                yield (b,)
+                b = []
+        if b: yield (b,)
+    total = 0.0
+    counts = Counter()
+    for logZ, interned, c in _imap(_counts_task, batches(), processes, window):
+        total += logZ
+        for j, v in interned.items():
+            counts[interner.keys[j]] += v
+        counts.update(c)
+    return total, counts
@@ -0,0 +1,82 @@
+"""Cube pruning (Chiang, 2007; Huang & Chiang, 2007).
+
+Bottom up, each node keeps at most `beam` hypotheses, best first.  The
+hypotheses of a node are generated from its incoming edges by exploring the
+cross product of the body nodes' hypothesis lists lazily with a heap, starting
+from the corner where every body uses its best hypothesis and moving one
+position along one dimension at a time.
+
+A non-local `combine(edge, states)` callback sees the states of the body
+hypotheses and returns a weight (in the hypergraph's semiring) to multiply in
+and the state of the new hypothesis, e.g. boundary words for a language
+model.  Hypotheses of a node with equal states are recombined, keeping the
+best.  Without non-local weights (and a large enough beam) the result is the
+exact k-best; with them it is an approximation whose quality is set by the
+beam.
+
+Weights are lowered to costs as in `hypergraphs.kbest`.
+"""
+import heapq
+from collections import namedtuple
+from hypergraphs import vectorized
+from hypergraphs.derivation import build
+from hypergraphs.kbest import _COSTS
+
+
+Hyp = namedtuple('Hyp', 'cost, edge, children, state')
+Hyp.__doc__ = 'A hypothesis: the edge used, the hypotheses of its body nodes and a non-local state.'
+
+
+def cube_prune(g, beam, combine=None):
+    """
+    Map from each node of `g` reachable from the root to its list of at most
+    `beam` hypotheses, best (lowest cost) first.
+    """
+    S = vectorized.scalar_semiring(g.kind)
+    assert S in _COSTS, f'no cube pruning for {g.kind}'
+    to_cost, _ = _COSTS[S]
+    def cost(w): return float(to_cost(S.lower(w)))
+    chart = {}
+    for x in g.toposort():
+        heap = []
+        seen = set()
+        n = 0
+        def push(e, lists, ranks):
+            nonlocal n
+            if (id(e), ranks) in seen: return
+            seen.add((id(e), ranks))
+            kids = tuple(l[r] for l, r in zip(lists, ranks))
+            c = cost(e.weight) + sum(h.cost for h in kids)
+            state = None
+            if combine is not None:
+                w, state = combine(e, [h.state for h in kids])
+                c += cost(w)
+            heapq.heappush(heap, (c, n, Hyp(c, e, kids, state), lists, ranks))
+            n += 1
+        for e in g.incoming[x]:
+            lists = [chart.get(b, ()) for b in e.body]
+            if all(lists):
+                push(e, lists, (0,) * len(lists))
+        # Pop `beam` hypotheses, then sort them: with non-local weights a
+        # later pop can be cheaper.  Recombination keeps the cheapest per state.
+        popped = []
+        while heap and len(popped) < beam:
+            _, _, h, lists, ranks = heapq.heappop(heap)
+            popped.append(h)
+            for i in range(len(ranks)):
+                if ranks[i] + 1 < len(lists[i]):
+                    push(h.edge, lists, ranks[:i] + (ranks[i] + 1,) + ranks[i+1:])
+        popped.sort(key=lambda h: h.cost)
+        hyps = []
+        states = set()
+        for h in popped:
+            if combine is None or h.state not in states:
+                states.add(h.state)
+                hyps.append(h)
+        if hyps: chart[x] = hyps
+    return chart
+
+
+def derivation(h):
+    "The derivation of hypothesis `h` as nested tuples `(edge, d_1, ..., d_n)`."
+    return build(h, lambda h: (h.edge, h.children))
@@ -0,0 +1,174 @@
+"""Inside values of hypergraphs with cycles.
+
+The nodes are grouped into strongly connected components, which are solved
+bottom up (Tarjan's algorithm emits them in that order).  A component without
+cycles is a single ordinary inside step.  A cyclic component is a system of
+polynomial equations `x = F(x)` in its nodes, with everything below it
+already known, and is solved by one of
+
+  - `kleene`: if each edge has at most one body node in the component, the
+    system is linear, `x = c + M x`, with solution `M* c`, computed by
+    Gauss-Jordan elimination with the semiring's `star`
+    (`hypergraphs.apps.kleene`);
+  - `newton`: Newton's method.  For real weights (`Float`), solve
+    `(I - J) d = F(x) - x` and step `x += d`; for idempotent semirings,
+    `x = J(x)* F(x)` (Esparza, Kiefer & Luttenberger, 2010).  Here `J` is
+    the Jacobian of `F`;
+  - `fixpoint`: iterate `x = F(x)` from zero.
+
+Iterative methods stop once no value moves by more than `tol` under
+`kind.metric`.  Multiplication must commute.
+"""
+import numpy as np
+from hypergraphs.hypergraph import _holes
+
+
+def sccs(g, root=None):
+    """
+    Strongly connected components of the nodes reachable from `root` (default
+    `g.root`), following edges from heads to bodies, in bottom-up order.
+    """
+    root = g.root if root is None else root
+    incoming = g.incoming
+    def children(v):
+        return (u for e in incoming.get(v, ()) for u in e.body)
+    index = {}; low = {}; stack = []; on = set(); out = []
+    work = [(root, children(root))]
+    index[root] = low[root] = 0; stack.append(root); on.add(root)
+    while work:
+        v, us = work[-1]
+        for u in us:
+            if u not in index:
+                index[u] = low[u] = len(index)
+                stack.append(u); on.add(u)
+                work.append((u, children(u)))
+                break
+            elif u in on:
+                low[v] = min(low[v], index[u])
+        else:
+            work.pop()
+            if work:
+                w = work[-1][0]
+                low[w] = min(low[w], low[v])
+            if low[v] == index[v]:
+                c = []
+                while True:
+                    u = stack.pop(); on.remove(u); c.append(u)
+                    if u == v: break
+                out.append(c[::-1])
+    return out
+
+
+def inside(g, method=None, tol=1e-10, max_iter=10_000):
+    """
+    Inside chart of a possibly cyclic hypergraph `g`.  `method` is one of
+    `'kleene'`, `'newton'`, `'fixpoint'` or None, which picks `kleene` for
+    linear components, otherwise `newton` where it applies and `fixpoint`
+    as the fallback.
+    """
+    assert method in (None, 'kleene', 'newton', 'fixpoint'), method
+    K = g.kind
+    B = K.chart()
+    for C in sccs(g):
+        edges = [e for x in C for e in g.incoming.get(x, ())]
+        if len(C) == 1 and not any(C[0] in e.body for e in edges):
+            for e in edges:
+                B[e.head] += _product(K, e, B)
+            continue
+        members = set(C)
+        linear = all(sum(b in members for b in e.body) <= 1 for e in edges)
+        m = method
+        if m is None:
+            m = 'kleene' if linear else 'newton' if _newton_applies(K) else 'fixpoint'
+        if m == 'kleene':
+            assert linear, 'kleene requires each edge to have at most one body node in the cycle'
+            _kleene(K, C, edges, B)
+        elif m == 'newton':
+            assert _newton_applies(K), f'no Newton step for {K}'
+            _newton(K, C, edges, B, tol, max_iter)
+        else:
+            _fixpoint(K, C, edges, B, tol, max_iter)
+    return B
+
+
+def _product(K, e, B):
+    v = e.weight
+    for b in e.body:
+        v = v * B[b]
+    return v
+
+
+def _newton_applies(K):
+    from semirings import Float
+    return K is Float or K.one + K.one == K.one
+
+
+def _converged(K, old, new, tol):
+    return all(K.metric(old[x], new[x]) <= tol for x in new)
+
+
+def _fixpoint(K, C, edges, B, tol, max_iter):
+    for _ in range(max_iter):
+        new = {x: K.zero for x in C}
+        for e in edges:
+            new[e.head] += _product(K, e, B)
+        done = _converged(K, B, new, tol)
+        B.update(new)
+        if done: return
+    raise ValueError(f'fixed-point iteration did not converge in {max_iter} iterations')
+
+
+def _jacobian(K, C, edges, B):
+    """
+    `F(x)` and the Jacobian `J[i,j] = dF_i/dx_j` over the component `C`,
+    evaluated at the current chart.
+    """
+    pos = {x: i for i, x in enumerate(C)}
+    n = len(C)
+    F = [K.zero] * n
+    J = np.full((n, n), K.zero, dtype=object)
+    for e in edges:
+        i = pos[e.head]
+        F[i] += _product(K, e, B)
+        bs = [B[b] for b in e.body]
+        for b, v in zip(e.body, _holes(K.one, e.weight, K.one, bs)):
+            if b in pos:
+                J[i, pos[b]] += v
+    return F, J
+
+
+def _kleene(K, C, edges, B):
+    from hypergraphs.apps.kleene import kleene
+    for x in C: B[x] = K.zero
+    F, M = _jacobian(K, C, edges, B)    # with x = 0: F = c and J = M
+    S = kleene(M, K)
+    for i, x in enumerate(C):
+        v = K.zero
+        for j in range(len(C)):
+            v += S[i, j] * F[j]
+        B[x] = v
+
+
+def _newton(K, C, edges, B, tol, max_iter):
+    from semirings import Float
+    from hypergraphs.apps.kleene import kleene
+    for x in C: B[x] = K.zero
+    n = len(C)
+    for _ in range(max_iter):
+        F, J = _jacobian(K, C, edges, B)
+        if K is Float:
+            x = np.array([B[x] for x in C], dtype=float)
+            d = np.linalg.solve(np.eye(n) - J.astype(float), np.array(F, dtype=float) - x)
+            new = dict(zip(C, (x + d).tolist()))
+        else:
+            S = kleene(J, K)
+            new = {}
+            for i, x in enumerate(C):
+                v = K.zero
+                for j in range(n):
+                    v += S[i, j] * F[j]
+                new[x] = v
+        done = _converged(K, B, new, tol)
+        B.update(new)
+        if done: return
+    raise ValueError(f'Newton iteration did not converge in {max_iter} iterations')
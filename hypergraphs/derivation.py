@@ -6,6 +6,28 @@ package.
 """
 
 
+def build(x, expand):
+    """
+    The derivation of `x` as nested tuples `(edge, d_1, ..., d_n)`, where
+    `expand(y)` returns the edge chosen for `y` and the sequence of its
+    children.  Children are expanded depth first, left to right, as a
+    recursive definition would, but with an explicit stack, so the depth of
+    the derivation is not limited by the recursion limit.
+    """
+    e, cs = expand(x)
+    stack = [(e, cs, [])]
+    while True:
+        e, cs, ds = stack[-1]
+        if len(ds) < len(cs):
+            e, cs = expand(cs[len(ds)])
+            stack.append((e, cs, []))
+            continue
+        stack.pop()
+        d = (e, *ds)
+        if not stack: return d
+        stack[-1][2].append(d)
+
+
 def post_process(f, derivation):
     "f: Edge -> str; derivation: list of lists with edges at the leaves."
     from nltk.tree import ImmutableTree as Tree
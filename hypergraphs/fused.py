@@ -0,0 +1,41 @@
+"""Inside evaluation fused with construction.
+
+Builders that add edges bottom up (CKY, `matrix_chain`, `VoCRF.graph`) can
+call `Hypergraph.fuse()` before adding any edges.  Each new edge is then
+folded into the inside chart on arrival, which requires that its body nodes
+are final: once a node has been used in a body, no more edges may enter it
+(checked).  Z is available as soon as the last edge is added, and with
+`keep_edges=False` the edges are not stored at all.
+
+For a semiring whose `+` returns one of its arguments (e.g. `MaxPlus`,
+`MinPlus`), a backpointer per node gives the Viterbi derivation, as in
+`LazyHypergraph.viterbi`.
+"""
+from hypergraphs.derivation import build
+
+
+class Fused:
+
+    def __init__(self, g, keep_edges=True):
+        self.g = g
+        self.keep_edges = keep_edges
+        self.chart = None if g.kind is None else g.kind.chart()
+        self.bp = {}
+        self.used = set()            # nodes used in a body, hence final
+
+    def add(self, e):
+        assert e.head not in self.used, f'edge into {e.head!r} after it was used in a body'
+        if self.chart is None: self.chart = self.g.kind.chart()
+        B = self.chart
+        v = e.weight
+        for b in e.body:
+            self.used.add(b)
+            v *= B[b]
+        best = B[e.head] + v
+        if best is v: self.bp[e.head] = e
+        B[e.head] = best
+
+    def viterbi(self, x):
+        "Best derivation of `x` as nested tuples `(edge, d_1, ..., d_n)`, or None."
+        if x not in self.bp: return None
+        return build(x, lambda x: (self.bp[x], self.bp[x].body))
@@ -1,4 +1,6 @@
+import numpy as np
 from collections import defaultdict, namedtuple
+from itertools import repeat
 
 
 Edge = namedtuple('Edge', 'weight, head, body')
@@ -11,43 +13,122 @@ class Hypergraph(object):
         self.edges = []
         self.root = root
         self.kind = kind
+        self.frozen = False
+        self._cache = {}      # derived structures; cleared by `edge`
+        self._fused = None    # see `fuse`
 
     def __repr__(self):
         return f'{self.__class__.__name__}({self.kind.__name__}, nodes={len(self.nodes)}, edges={len(self.edges)})'
 
     def edge(self, weight, head, *body):
+        assert not self.frozen, 'cannot add edges to a frozen hypergraph'
         if self.kind is None: self.kind = type(weight)
         e = Edge(weight, head, body)
+        if self._fused is not None:
+            self._fused.add(e)
+            if not self._fused.keep_edges: return e
         self.incoming[e.head].append(e)
         self.edges.append(e)
+        if self._cache: self._cache.clear()
         return e
 
+    def add_edges(self, heads, bodies, weights, nodes=None):
+        """
+        Add many edges at once: edge `i` has head `heads[i]`, body `bodies[i]`
+        and weight `weights[i]`.  Each argument may be an iterable or a NumPy
+        array (`bodies` as a 2-d array when all bodies have the same arity).
+        With `nodes`, heads and bodies are integer ids into it, e.g. the node
+        table of an interner; otherwise they are the node keys themselves.
+        """
+        assert not self.frozen, 'cannot add edges to a frozen hypergraph'
+        if self._fused is not None:
+            for w, h, b in _edge_lists(heads, bodies, weights, nodes):
+                self.edge(w, h, *b)
+            return
+        new = list(map(Edge._make, _edge_lists(heads, bodies, weights, nodes)))
+        incoming = self.incoming
+        for e in new:
+            incoming[e.head].append(e)
+        self.edges.extend(new)
+        if self.kind is None and new: self.kind = type(new[0].weight)
+        if self._cache: self._cache.clear()
+
+    def fuse(self, keep_edges=True):
+        """
+        Evaluate the inside chart while edges are added, for builders that add
+        every edge into a node before using the node in a body (checked).
+        `inside`, `Z` and `viterbi` then read the chart directly; with
+        `keep_edges=False`, edges are not stored.  See `hypergraphs.fused`.
+        """
+        from hypergraphs.fused import Fused
+        assert not self.edges and self._fused is None, 'fuse must be called before adding edges'
+        self._fused = Fused(self, keep_edges)
+        return self
+
+    def freeze(self):
+        "Disallow further edges, so cached orderings stay valid."
+        self.frozen = True
+        return self
+
     @property
     def nodes(self):
         return self.incoming.keys()
 
     def terminals(self):
-        terminals = set()
-        for e in self.edges:
-            for b in e.body:
-                if not self.incoming[b]:
-                    terminals.add(b)
-        return terminals
+        "Body nodes without incoming edges (cached until the next call to `edge`)."
+        if 'terminals' not in self._cache:
+            incoming = self.incoming
+            self._cache['terminals'] = frozenset(
+                b for e in self.edges for b in e.body if not incoming.get(b)
+            )
+        return self._cache['terminals']
 
-    def toposort(self):
-        visited = set()
-
-        def t(v):
-            if v not in visited:
-                visited.add(v)
-                if self.incoming[v]:
-                    for e in self.incoming[v]:
-                        for u in e.body:
-                            yield from t(u)
-                    yield v
+    def outgoing(self):
+        "Map from each node to the edges with it in their body (cached until the next call to `edge`)."
+        if 'outgoing' not in self._cache:
+            outgoing = defaultdict(list)
+            for e in self.edges:
+                for b in dict.fromkeys(e.body):
+                    outgoing[b].append(e)
+            self._cache['outgoing'] = dict(outgoing)
+        return self._cache['outgoing']
 
+    def toposort(self):
+        """
+        Nodes with incoming edges that are reachable from the root, ordered so
+        that each node follows the bodies of its edges (cached until the next
+        call to `edge`).
+        """
         assert self.root is not None
-        return t(self.root)
+        key = ('toposort', self.root)
+        if key not in self._cache:
+            self._cache[key] = self._toposort()
+        return self._cache[key]
+
+    def _toposort(self):
+        # Iterative depth-first search; emits nodes in the same post-order as
+        # the obvious recursive implementation.
+        incoming = self.incoming
+        def children(v):
+            return (u for e in incoming.get(v, ()) for u in e.body)
+        order = []
+        visited = {self.root}
+        active = {self.root}
+        stack = [(self.root, children(self.root))]
+        while stack:
+            v, us = stack[-1]
+            for u in us:
+                if u not in visited:
+                    visited.add(u)
+                    active.add(u)
+                    stack.append((u, children(u)))
+                    break
+                assert u not in active, f'hypergraph has a cycle through {u!r}'
+            else:
+                stack.pop()
+                active.remove(v)
+                if incoming.get(v): order.append(v)
+        return tuple(order)
 
     def graphviz(self, output):
         from arsenal.iterextras import window
@@ -60,7 +141,7 @@ class Hypergraph(object):
                     print('  "%s" -> "%s";' % (id(e), e.head), file=f)
                     for b in e.body:
                         print('  "%s" -> "%s" [arrowhead=none];' % (b, id(e)), file=f)
-                        if not self.incoming[b]:
+                        if not self.incoming.get(b):
                             terminals.add(b)
             if terminals:
                 #print(terminals)
@@ -84,13 +165,57 @@ class Hypergraph(object):
         svg = open(self.show(gopen=False)).read()
         display(HTML(svg))
 
+    def compile(self, dtype=None):
+        """Frozen, array-backed copy of this hypergraph (see `hypergraphs.compiled`).
+
+        With `dtype=None` the edge weights are kept as semiring objects;
+        otherwise they are packed into a numeric array of that dtype.  The
+        result is cached until the next call to `edge`.
+        """
+        from hypergraphs.compiled import CompiledHypergraph
+        key = ('compile', dtype, self.root)
+        if key not in self._cache:
+            self._cache[key] = CompiledHypergraph.from_hypergraph(self, dtype)
+        return self._cache[key]
+
+    def with_weights(self, weight, kind=None, semiring=None):
+        """
+        `self.compile()` with other edge weights, aligned with `self.edges`:
+        a view that shares the compiled topology instead of rebuilding the
+        graph (see `CompiledHypergraph.with_weights`).
+        """
+        return self.compile().with_weights(weight, kind=kind, semiring=semiring)
+
     def Z(self):
         "Evaluate the partition function (total score of root node)."
+        if self._fused is not None:
+            return self._fused.chart[self.root]
         return self.inside()[self.root]
 
-    def inside(self):
-        "Run inside algorithm on hypergraph."
+    def _scalar(self, engine):
+        "The vectorized semiring to use for `engine`, or None for the generic path."
+        assert engine in (None, 'python', 'numpy'), engine
+        if engine == 'numpy':
+            from hypergraphs.vectorized import scalar_semiring
+            return scalar_semiring(self.kind)
+
+    def inside(self, engine=None, workers=None):
+        """Run inside algorithm on hypergraph.
+
+        `engine='numpy'` evaluates real, log, max-plus, min-plus and boolean
+        weights level-by-level with NumPy (see `hypergraphs.vectorized`),
+        optionally on `workers` threads; other semirings fall back to the
+        generic path.
+        """
+        S = self._scalar(engine)
+        if S is not None:
+            from hypergraphs.vectorized import inside
+            cg = self._reachable().compile()
+            return cg.to_chart(map(S.lift, inside(cg, S, workers=workers)))
         B = self.kind.chart()
+        if self._fused is not None:
+            B.update(self._fused.chart)     # a copy: the live chart keeps changing
+            return B
         for x in self.toposort():
             for e in self.incoming[x]:
                 v = self.kind.one
@@ -99,25 +224,109 @@ class Hypergraph(object):
                 B[x] += e.weight * v
         return B
 
-    # TODO: modify the outside algorithm to support non-AC multiplication.
-    def outside(self, B):
-        "Run outside algorithm on hypergraph."
+    def viterbi(self):
+        """
+        Value and best derivation of the root, for a semiring whose `+` returns
+        one of its arguments (e.g. `MaxPlus`, `MinPlus`).  Derivations are
+        nested tuples `(edge, d_1, ..., d_n)`, as in `LazyHypergraph.viterbi`.
+        """
+        if self._fused is not None:
+            return self._fused.chart[self.root], self._fused.viterbi(self.root)
+        from hypergraphs.fused import Fused
+        f = Fused(self)
+        for x in self.toposort():
+            for e in self.incoming[x]:
+                f.add(e)
+        return f.chart[self.root], f.viterbi(self.root)
+
+    def solve(self, method=None, tol=1e-10, max_iter=10_000):
+        "Inside chart of a hypergraph that may have cycles; see `hypergraphs.cyclic`."
+        from hypergraphs.cyclic import inside
+        return inside(self, method=method, tol=tol, max_iter=max_iter)
+
+    def incremental(self, delta=None):
+        "Inside chart that is kept up to date under edge-weight updates; see `hypergraphs.incremental`."
+        from hypergraphs.incremental import IncrementalInside
+        return IncrementalInside(self, delta=delta)
+
+    def inside_batch(self, W, outside=False, semiring=None, workers=None):
+        """Inside (and optionally outside) charts under many weightings at once.
+
+        `W` is a `[batch, num_edges]` array of edge weights, aligned with
+        `self.edges` and expressed in the scalar semiring `semiring` (a
+        `hypergraphs.vectorized.Scalar`; by default the one matching
+        `self.kind`).  Returns `[batch, num_nodes]` arrays whose columns are
+        the node ids of `self.compile()`.
+        """
+        from hypergraphs import vectorized
+        S = vectorized.scalar_semiring(self.kind) if semiring is None else semiring
+        assert S is not None, f'no vectorized semiring for {self.kind}'
+        cg = self.compile()
+        B = vectorized.inside(cg, S, W, workers)
+        if outside:
+            return B, vectorized.outside(cg, S, B, W, workers)
+        return B
+
+    def grad(self, log=False):
+        """Gradient of log Z with respect to each edge weight, as an array aligned
+        with `self.edges`.
+
+        With `log=True`, the gradient with respect to the log of each weight:
+        the expected edge counts.  Requires real (`Float`) or `LogVal` weights;
+        see `hypergraphs.vectorized.grad`.
+        """
+        from hypergraphs import vectorized
+        S = vectorized.scalar_semiring(self.kind)
+        assert S in (vectorized.REAL, vectorized.LOG), f'grad needs real weights, not {self.kind}'
+        cg = self.compile()
+        theta = cg.lower(S)
+        if S is vectorized.REAL:
+            assert (theta >= 0).all(), 'grad needs nonnegative weights'
+            with np.errstate(divide='ignore'):
+                theta = np.log(theta)
+        return vectorized.grad(cg, theta, log=log)
+
+    def sample(self, n, inside=None, logprob=False, rng=None):
+        """Draw `n` derivations of the root in proportion to their weight, top
+        down from the inside chart (real or `LogVal` weights).
+
+        `inside` may be a chart from `inside()`, or an array indexed by the
+        node ids of `self.compile()`, so that it can be reused across calls.
+        Returns `hypergraphs.sampler.Samples`, whose edge ids index
+        `self.edges`, and with `logprob=True` also the log-probability of
+        each sample.
+        """
+        from hypergraphs import vectorized
+        from hypergraphs.sampler import inside_sampler
+        S = vectorized.scalar_semiring(self.kind)
+        assert S in (vectorized.REAL, vectorized.LOG), f'sample needs real weights, not {self.kind}'
+        cg = self.compile()
+        if inside is not None and not isinstance(inside, np.ndarray):
+            inside = np.array([S.lower(inside[x]) for x in cg.nodes], dtype=float)
+        samples = inside_sampler(cg, S, inside).sample(n, rng)
+        return (samples, samples.logprob) if logprob else samples
+
+    def outside(self, B, engine=None, workers=None):
+        """Run outside algorithm on hypergraph; see `inside` for `engine` and `workers`.
+
+        Each edge `x <- w, b_1 ... b_n` adds
+          w * B[b_1] * ... * B[b_{i-1}] * A[x] * B[b_{i+1}] * ... * B[b_n]
+        to `A[b_i]`.  The factors stay in body order, so multiplication need
+        not commute, and prefix/suffix products make each edge cost O(n).
+        """
+        S = self._scalar(engine)
+        if S is not None:
+            from hypergraphs.vectorized import outside
+            cg = self._reachable().compile()
+            B = np.array([S.lower(B[x]) for x in cg.nodes], dtype=S.dtype)
+            return cg.to_chart(map(S.lift, outside(cg, S, B, workers=workers)))
         A = self.kind.chart()
         A[self.root] = self.kind.one
-        for x in reversed(list(self.toposort())):
+        for x in reversed(self.toposort()):
             for e in self.incoming[x]:
-                # TODO: The code below is quadratic in the arity of the edge,
-                # this can be improved to linear with the gradient-of-product
-                # trick.  Or, equivalently, by binarizing the edges of the
-                # graph.
-                for y in e.body:
-                    w = self.kind.one
-                    for z in e.body:
-                        if y == z:
-                            w *= A[x]
-                        else:
-                            w *= B[z]
-                    A[y] += e.weight * w
+                holes = _holes(self.kind.one, e.weight, A[x], [B[y] for y in e.body])
+                for y, v in zip(e.body, holes):
+                    A[y] += v
         return A
 
     def insideout(self, inside, outside, X, zero):
@@ -139,26 +348,88 @@ class Hypergraph(object):
             xhat = xhat + X(e) * kbar
         return inside[self.root], xhat
 
-    def _prune_topo(self):
-        return self.prune_nodes(set(self.toposort()))
+    def expected_features(self, F):
+        """Expected feature values `sum_e p_e F[e]` as one (sparse) matrix-vector
+        product, where `F` is an edge-by-feature matrix (e.g.
+        `scipy.sparse.csr_matrix`) whose rows are aligned with `self.edges` and
+        `p_e` is the marginal of edge `e` (its expected count).
+
+        `p` is `grad(log=True)`, computed by the vectorized engine (real or
+        `LogVal` weights only), so the result is finite even when Z is not.
+        For unnormalized totals from charts, see `feature_totals`.
+        """
+        return F.T @ self.grad(log=True)
+
+    def feature_totals(self, F, inside, outside, value=float):
+        """Unnormalized feature totals `sum_e c_e F[e]` from the charts, for
+        the unnormalized marginals
+          c_e = outside[head(e)] * w_e * prod_b inside[b]
+        (`expected_features` divides by `inside[root]`).  This is the `xhat` of
+        `insideout` with `X(e) = w_e F[e]`, without building a feature vector
+        per edge.  `value` maps each `c_e` to a number or a tuple of numbers,
+        giving a `[features, len(tuple)]` result; e.g., with `Expectation`
+        charts, `value=lambda k: (k.p, k.r)` yields the first- and second-order
+        totals that `insideout` computes with `SecondOrderExpectation`.
+        """
+        c = []
+        for e in self.edges:
+            k = outside[e.head] * e.weight
+            for b in e.body:
+                k *= inside[b]
+            c.append(value(k))
+        return F.T @ np.array(c, dtype=float)
 
     def prune_topo(self, verbose=0):
         """
         Eliminate nodes/edges from hypergraph which don't feed into any valid
-        derivations of the root node.
-        """
-        # TODO: we shouldn't need to run topo-pruning to fixed point.
-        r = 0
-        prev = self
-        while True:
-            if verbose:
-                print('prune round', r, prev)
-            curr = prev._prune_topo()
-            if len(curr.edges) == len(prev.edges):
-                break
-            prev = curr
-            r += 1
-        return curr
+        derivations of the root node.  Single pass; see
+        `CompiledHypergraph.prune_mask`.
+        """
+        r = self._reachable()
+        cg = r.compile()
+        node_keep, edge_keep = cg.prune_mask()
+        if verbose:
+            V = len(set(self.incoming).union(self.terminals())); E = len(self.edges)
+            print(f'prune_topo: removed {V - node_keep.sum()} of {V} nodes'
+                  f' and {E - edge_keep.sum()} of {E} edges')
+        g = Hypergraph(self.root, self.kind)
+        for e, keep in zip(r.edges, edge_keep.tolist()):
+            if keep: g.edge(e.weight, e.head, *e.body)
+        return g
+
+    def _reachable(self):
+        """
+        `self`, or a copy with only the edges into nodes reachable from the
+        root, for the algorithms that only need those (parts that the root
+        cannot reach may have cycles, which `compile` rejects).
+        """
+        key = ('reachable', self.root)
+        if key not in self._cache:
+            keep = set(self.toposort())
+            g = self
+            if len(keep) < sum(1 for es in self.incoming.values() if es):
+                g = Hypergraph(self.root, self.kind)
+                for e in self.edges:
+                    if e.head in keep: g.edge(e.weight, e.head, *e.body)
+            self._cache[key] = g
+        return self._cache[key]
+
+    def binarize(self, direction='left', head=None):
+        """
+        Equivalent hypergraph whose edges have at most two body nodes, with a
+        map back to these edges; see `hypergraphs.binarize`.
+        """
+        from hypergraphs.binarize import binarize
+        return binarize(self, direction=direction, head=head)
+
+    def compress(self, hashcons=False, merge=None, verbose=0):
+        """
+        Smaller equivalent hypergraph: unary chains contracted, parallel edges
+        merged and, optionally, identical sub-forests shared, with a map back
+        to these edges; see `hypergraphs.compress`.
+        """
+        from hypergraphs.compress import compress
+        return compress(self, hashcons=hashcons, merge=merge, verbose=verbose)
 
     def prune_nodes(self, nodes):
         "Prune graph down to a set of nodes."
@@ -169,7 +440,11 @@ class Hypergraph(object):
         return g
 
     def apply(self, f):
-        "Transform this hypergraphs's edge weights via `f(edge) -> weight`."
+        """
+        Transform this hypergraphs's edge weights via `f(edge) -> weight`;
+        edges where `f` returns None are dropped.  To only change weights, see
+        `with_weights`, which does not copy the graph.
+        """
         H = self.__class__(self.root)
         for e in self.edges:
             w = f(e)
@@ -177,6 +452,38 @@ class Hypergraph(object):
                 H.edge(w, e.head, *e.body)
         return H
 
+    def best_first(self, heuristic=None):
+        "Best value and derivation of the root by agenda-driven search; see `hypergraphs.agenda`."
+        from hypergraphs.agenda import best_first
+        return best_first(self, heuristic=heuristic)
+
+    def kbest(self, k=None, limit=None):
+        """
+        Generate the `k` (default: all) best `(value, derivation)` pairs of the
+        root, best first; see `hypergraphs.kbest`.  The search state is cached
+        until the next call to `edge`, so later calls resume the work.
+        """
+        from hypergraphs.kbest import KBest
+        key = ('kbest', limit, self.root)
+        if key not in self._cache:
+            self._cache[key] = KBest(self.compile(), self.edges, limit)
+        return self._cache[key].derivations(k)
+
+    def cube_prune(self, beam, combine=None):
+        """
+        Best `(value, derivation)` of the root found by cube pruning with at
+        most `beam` hypotheses per node and the non-local weights of
+        `combine`; see `hypergraphs.cube`.  Returns `(None, None)` if none
+        survives.
+        """
+        from hypergraphs import vectorized
+        from hypergraphs.cube import cube_prune, derivation
+        from hypergraphs.kbest import _COSTS
+        hyps = cube_prune(self, beam, combine).get(self.root)
+        if not hyps: return None, None
+        S = vectorized.scalar_semiring(self.kind)
+        return S.lift(_COSTS[S][1](hyps[0].cost)), derivation(hyps[0])
+
     def sorted(self):
         return self._sorted().Z()
 
@@ -185,3 +492,33 @@ class Hypergraph(object):
         return self.apply(lambda e: LazySort(e.weight, e))
 
 
+def _edge_lists(heads, bodies, weights, nodes):
+    "`(weight, head, body)` triples for `Hypergraph.add_edges`."
+    if nodes is not None and isinstance(heads, np.ndarray):
+        # Look the ids up with NumPy (in C) through an object array of keys.
+        table = np.fromiter(nodes, dtype=object, count=len(nodes))
+        heads = table[heads]
+        if isinstance(bodies, np.ndarray): bodies = table[bodies]
+        else: bodies = [table[np.asarray(body, dtype=np.int64)].tolist() for body in bodies]
+        nodes = None
+    if isinstance(bodies, np.ndarray):
+        # Zip the columns into body tuples, rather than make a list per row.
+        bodies = zip(*bodies.T.tolist()) if bodies.shape[1] else repeat((), len(bodies))
+    heads, weights = (x.tolist() if isinstance(x, np.ndarray) else x for x in (heads, weights))
+    if nodes is None:
+        return zip(weights, heads, map(tuple, bodies))
+    return zip(weights, map(nodes.__getitem__, heads),
+               (tuple(map(nodes.__getitem__, body)) for body in bodies))
+
+
+def _holes(one, w, a, bs):
+    """
+    For each position `i`, the product `w * bs[0] * ... * bs[i-1] * a *
+    bs[i+1] * ... * bs[-1]`, in order, using O(len(bs)) multiplications.
+    """
+    suffix = [one] * len(bs)
+    for i in reversed(range(len(bs) - 1)):
+        suffix[i] = bs[i+1] * suffix[i+1]
+    for i, b in enumerate(bs):
+        yield w * a * suffix[i]
+        w = w * b
@@ -0,0 +1,117 @@
+"""Incremental inside after sparse edge-weight updates.
+
+`IncrementalInside` holds the inside chart of a hypergraph and its own copy
+of the edge weights.  `update` changes a few weights and re-evaluates only
+the ancestors of the changed edges' heads, found through the outgoing-edge
+index (`Hypergraph.outgoing`), in topological order.  Propagation stops at
+nodes whose value does not change (exactly: `LogVal` and `MaxPlus` compare
+with a tolerance under `==`), so the cost of an update is proportional
+to the edges in the affected cone rather than the graph.
+
+A node can be re-evaluated in two ways:
+
+  - delta propagation, for semirings with subtraction (real, log): only the
+    edges into the node that changed (new weight or a changed body node) are
+    visited, and the difference between their new and old products is added
+    to the node's value.  Rounding errors accumulate over many updates;
+    `refresh` recomputes the chart from scratch.
+  - recomputation, for all other semirings: the node's value is summed again
+    over all of its incoming edges.
+"""
+import heapq
+
+
+class IncrementalInside:
+
+    def __init__(self, g, delta=None):
+        """
+        `g` is an acyclic `Hypergraph`; it is not modified.  `delta` selects
+        delta propagation, by default for `Float` and `LogVal` weights.
+        """
+        from semirings import Float, LogVal
+        self.g = g
+        self.delta = g.kind in (Float, LogVal) if delta is None else delta
+        self.weight = [e.weight for e in g.edges]
+        self._id = {id(e): i for i, e in enumerate(g.edges)}
+        self._rank = {x: r for r, x in enumerate(g.toposort())}
+        self.refresh()
+
+    def refresh(self):
+        "Recompute the chart from scratch."
+        g = self.g
+        self.chart = B = g.kind.chart()
+        for x in g.toposort():
+            B[x] = self._sum(x)
+
+    def __getitem__(self, x):
+        return self.chart[x]
+
+    @property
+    def Z(self):
+        return self.chart[self.g.root]
+
+    def _product(self, e, B, old):
+        v = self.g.kind.one
+        for b in self.g.edges[e].body:
+            v *= old[b] if b in old else B[b]
+        return v
+
+    def _sum(self, x):
+        B = self.chart; w = self.weight; ids = self._id
+        v = self.g.kind.zero
+        for e in self.g.incoming[x]:
+            i = ids[id(e)]
+            v += w[i] * self._product(i, B, {})
+        return v
+
+    def update(self, changes):
+        """
+        Set the weights of some edges, given as a dict (or iterable of pairs)
+        from edge (an `Edge` of `g` or its position in `g.edges`) to weight.
+        Returns the nodes whose inside value changed.
+        """
+        g = self.g; B = self.chart; w = self.weight
+        rank = self._rank; ids = self._id
+        old_w = {}                   # old weights of the changed edges
+        dirty = {}                   # node -> ids of its edges to revisit
+        for e, v in dict(changes).items():
+            i = e if isinstance(e, int) else ids[id(e)]
+            old_w.setdefault(i, w[i])
+            w[i] = v
+            dirty.setdefault(g.edges[i].head, set()).add(i)
+        queue = [(rank[x], x) for x in dirty if x in rank]
+        heapq.heapify(queue)
+        queued = set(dirty)
+        old = {}                     # old values of the changed nodes
+        outgoing = g.outgoing()
+        while queue:
+            _, x = heapq.heappop(queue)
+            if self.delta:
+                d = g.kind.zero
+                for i in dirty[x]:
+                    d += w[i] * self._product(i, B, {}) - old_w.get(i, w[i]) * self._product(i, B, old)
+                v = B[x] + d
+            else:
+                v = self._sum(x)
+            if _same(v, B[x]): continue
+            old[x] = B[x]
+            B[x] = v
+            for e in outgoing.get(x, ()):
+                y = e.head
+                if y not in rank: continue
+                if y not in queued:
+                    queued.add(y)
+                    heapq.heappush(queue, (rank[y], y))
+                dirty.setdefault(y, set()).add(ids[id(e)])
+        return list(old)
+
+
+def _same(a, b):
+    "Exact equality; a semiring's `==` may allow a tolerance."
+    if a is b: return True
+    if type(a) is not type(b): return False
+    if isinstance(a, (int, float)): return a == b
+    try:
+        return bool(vars(a) == vars(b))
+    except (TypeError, ValueError):  # no fields, or array-valued ones
+        return False
@@ -0,0 +1,167 @@
+"""Lazy k-best derivations (Huang & Chiang, 2005, Algorithm 3).
+
+Each node keeps the derivations found so far, best first, and a heap of
+candidates.  A derivation is a backpointer `(cost, edge, ranks)`: the edge id
+and, for each body node, the rank of the subderivation used there.  The 1-best
+of every node comes from one Viterbi pass; further derivations of a node are
+generated only when they are requested, from the successors of the ones
+already popped (the same edge with one rank incremented), which in turn
+requests the needed subderivations.
+
+A successor increments position `i` only if all later ranks are zero, so
+each rank vector has a unique predecessor and no "seen" set is needed.
+
+Weights are lowered to additive costs (smaller is better) for real, log,
+max-plus and min-plus semirings; see `hypergraphs.vectorized`.
+"""
+import heapq
+import numpy as np
+from hypergraphs import vectorized
+from hypergraphs.derivation import build
+
+
+_COSTS = {
+    # to cost, from cost
+    vectorized.REAL: (lambda w: -np.log(w), lambda c: np.exp(-c)),
+    vectorized.LOG: (lambda w: -w, lambda c: -c),
+    vectorized.MAXPLUS: (lambda w: -w, lambda c: -c),
+    vectorized.MINPLUS: (lambda w: w, lambda c: c),
+}
+
+
+class KBest:
+    """
+    k-best derivations of the nodes of the `CompiledHypergraph` `cg`.
+
+    With `limit`, at most `limit` derivations are kept (and at most about
+    twice as many candidates) per node, which bounds memory but means only
+    the top `limit` derivations of each node can be produced.  Derivations
+    are nested tuples `(edge, d_1, ..., d_n)` where `edge` is `edges[e]` if
+    `edges` is given and the edge id `e` otherwise.
+    """
+
+    def __init__(self, cg, edges=None, limit=None):
+        S = vectorized.scalar_semiring(cg.kind)
+        assert S in _COSTS, f'no k-best for {cg.kind}'
+        to_cost, self._from_cost = _COSTS[S]
+        self.S = S
+        self.cg = cg
+        self.edges = edges
+        self.limit = limit
+        with np.errstate(divide='ignore'):
+            self.cost = to_cost(cg.lower(S)).astype(float).tolist()
+        _, self.body_ptr, self.body, self.in_ptr, self.in_edge = cg._lists
+        self.D = self._viterbi()
+        self.cand = [None] * cg.num_nodes
+        self.expanded = [0] * cg.num_nodes   # D[v][:expanded[v]] have pushed their successors
+        self.exhausted = [False] * cg.num_nodes
+
+    def _viterbi(self):
+        "The 1-best derivation of each node, bottom up."
+        body_ptr, body, in_ptr, in_edge, cost = self.body_ptr, self.body, self.in_ptr, self.in_edge, self.cost
+        D = []
+        for x in range(self.cg.num_nodes):
+            best = None
+            for e in in_edge[in_ptr[x]:in_ptr[x+1]]:
+                c = cost[e]
+                for b in body[body_ptr[e]:body_ptr[e+1]]:
+                    c += D[b][0][0] if D[b] else np.inf
+                if c < np.inf and (best is None or c < best[0]):
+                    best = (c, e, (0,) * (body_ptr[e+1] - body_ptr[e]))
+            D.append([best] if best is not None else [])
+        return D
+
+    def _candidates(self, v):
+        "Every incoming edge of `v` with all-zero ranks, except the 1-best."
+        body_ptr, body, D = self.body_ptr, self.body, self.D
+        first = D[v][0][1]
+        cand = []
+        for e in self.in_edge[self.in_ptr[v]:self.in_ptr[v+1]]:
+            if e == first: continue
+            bs = body[body_ptr[e]:body_ptr[e+1]]
+            if all(D[b] for b in bs):
+                cand.append((self.cost[e] + sum(D[b][0][0] for b in bs), e, (0,) * len(bs)))
+        heapq.heapify(cand)
+        return cand
+
+    def _successors(self, d):
+        "Positions `i` of the successors of `d` (one rank incremented), with the body node and its new rank."
+        _, e, ranks = d
+        bs = self.body[self.body_ptr[e]:self.body_ptr[e+1]]
+        for i in reversed(range(len(bs))):
+            yield i, bs[i], ranks[i] + 1
+            if ranks[i]: break     # only increment positions after the last nonzero rank
+
+    def _push_successors(self, cand, d):
+        "Push the successors of `d` whose body derivations exist (all have been filled)."
+        _, e, ranks = d
+        bs = self.body[self.body_ptr[e]:self.body_ptr[e+1]]
+        for i, b, r in self._successors(d):
+            if len(self.D[b]) > r:
+                rs = ranks[:i] + (r,) + ranks[i+1:]
+                c = self.cost[e]
+                for b, j in zip(bs, rs):
+                    c += self.D[b][j][0]
+                heapq.heappush(cand, (c, e, rs))
+
+    def _settled(self, v, j):
+        "Whether `D[v]` has a `j`th derivation or never will."
+        D = self.D[v]
+        return (len(D) > j or not D or self.exhausted[v]
+                or (self.limit is not None and j >= self.limit))
+
+    def _fill(self, v, j):
+        """
+        Extend `D[v]` to at least `j+1` derivations, if there are that many.
+        Requests for the body nodes' derivations go on an explicit stack, so
+        deep graphs do not hit the recursion limit.
+        """
+        stack = [(v, j)]
+        while stack:
+            x, k = stack[-1]
+            if self._settled(x, k):
+                stack.pop()
+                continue
+            if self.cand[x] is None: self.cand[x] = self._candidates(x)
+            D = self.D[x]; cand = self.cand[x]
+            if self.expanded[x] < len(D):
+                d = D[self.expanded[x]]
+                needs = [(b, r) for _, b, r in self._successors(d) if not self._settled(b, r)]
+                if needs:
+                    stack.extend(needs)
+                    continue
+                self._push_successors(cand, d)
+                self.expanded[x] += 1
+            elif not cand:
+                self.exhausted[x] = True
+            else:
+                D.append(heapq.heappop(cand))
+                if self.limit is not None and len(cand) > 2 * (self.limit - len(D)):
+                    cand[:] = heapq.nsmallest(self.limit - len(D), cand)
+        return len(self.D[v]) > j
+
+    def kth(self, j, v=None):
+        "The `j`th best (value, derivation) of `v` (default: root), counting from 0, or None."
+        if v is None: v = self.cg.root
+        if not self._fill(v, j): return None
+        return self.S.lift(self._from_cost(self.D[v][j][0])), self.derivation(v, j)
+
+    def derivation(self, v, j):
+        def expand(vj):
+            _, e, ranks = self.D[vj[0]][vj[1]]
+            bs = self.body[self.body_ptr[e]:self.body_ptr[e+1]]
+            return (e if self.edges is None else self.edges[e]), list(zip(bs, ranks))
+        return build((v, j), expand)
+
+    def derivations(self, k=None, v=None):
+        """
+        Generate the `k` (default: all) best `(value, derivation)` pairs of `v`
+        (default: root), best first.  The work done is kept, so a new or
+        partially consumed generator picks up where the others left off.
+        """
+        j = 0
+        while k is None or j < k:
+            d = self.kth(j, v)
+            if d is None: return
+            yield d
+            j += 1
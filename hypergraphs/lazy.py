@@ -0,0 +1,122 @@
+"""Hypergraphs given by a recurrence instead of an edge list.
+
+A `LazyHypergraph` is specified by its nodes, in topological order, and a
+function `incoming(x)` that generates the `(weight, body)` pairs of the edges
+into `x`.  Edges are produced on demand and dropped after use, so the inside
+algorithm (and Viterbi, sampling) only ever holds the chart.  Two-pass
+algorithms such as outside call `incoming` again on the way down, or, with
+`record=True`, replay edges stored during the first pass.
+"""
+import numpy as np
+from hypergraphs.hypergraph import Hypergraph, Edge, _holes
+from hypergraphs.derivation import build
+
+
+class LazyHypergraph:
+
+    def __init__(self, root, kind, nodes, incoming, record=False):
+        """
+        `nodes` is a reiterable sequence (e.g. a list or range) in which each
+        node follows the bodies of its incoming edges; `incoming(x)` yields
+        `(weight, body)` pairs.  With `record=True`, the edges generated by
+        the first pass are kept so that later passes need not regenerate them.
+        """
+        self.root = root
+        self.kind = kind
+        self.nodes = nodes
+        self._incoming = incoming
+        self.record = record
+        self._edges = {}
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.kind.__name__}, root={self.root!r})'
+
+    def incoming(self, x):
+        "The `Edge`s into `x`."
+        if x in self._edges:
+            return self._edges[x]
+        es = [Edge(w, x, tuple(body)) for w, body in self._incoming(x)]
+        if self.record: self._edges[x] = es
+        return es
+
+    def edges(self):
+        "Generate all edges, in topological order of their heads."
+        for x in self.nodes:
+            yield from self.incoming(x)
+
+    def materialize(self):
+        "Equivalent `Hypergraph` with all of the edges allocated."
+        g = Hypergraph(self.root, self.kind)
+        for e in self.edges():
+            g.edge(e.weight, e.head, *e.body)
+        return g
+
+    def inside(self):
+        "Run inside algorithm without materializing the edges."
+        B = self.kind.chart()
+        for e in self.edges():
+            v = self.kind.one
+            for b in e.body:
+                v *= B[b]
+            B[e.head] += e.weight * v
+        return B
+
+    def Z(self):
+        "Evaluate the partition function (total score of root node)."
+        return self.inside()[self.root]
+
+    def outside(self, B):
+        "Run outside algorithm, given the inside chart `B`; see `Hypergraph.outside`."
+        A = self.kind.chart()
+        A[self.root] = self.kind.one
+        nodes = self.nodes if hasattr(self.nodes, '__reversed__') else list(self.nodes)
+        for x in reversed(nodes):
+            for e in self.incoming(x):
+                holes = _holes(self.kind.one, e.weight, A[x], [B[y] for y in e.body])
+                for y, v in zip(e.body, holes):
+                    A[y] += v
+        return A
+
+    def viterbi(self):
+        """
+        Best derivation of the root and its value, for a semiring whose `+`
+        returns one of its arguments (e.g. `MaxPlus`, `MinPlus`).
+
+        Derivations are nested tuples `(edge, d_1, ..., d_n)` with one
+        subderivation per body node.  Only the chart and one backpointer per
+        node are stored.
+        """
+        B = self.kind.chart()
+        bp = {}
+        for e in self.edges():
+            v = e.weight
+            for b in e.body:
+                v *= B[b]
+            best = B[e.head] + v
+            if best is v:
+                bp[e.head] = e
+            B[e.head] = best
+        return B[self.root], (build(self.root, lambda x: (bp[x], bp[x].body)) if self.root in bp else None)
+
+    def sample(self, B=None, value=float, rng=None):
+        """
+        Sample a derivation of the root with probability proportional to its
+        weight, given the inside chart `B` (computed if omitted).  `value`
+        maps chart values to nonnegative reals.  Derivations are as in
+        `viterbi`; only the edges along the sampled derivation are generated
+        a second time.
+        """
+        if B is None: B = self.inside()
+        if rng is None: rng = np.random.default_rng()
+        def expand(x):
+            es = self.incoming(x)
+            ps = []
+            for e in es:
+                v = e.weight
+                for b in e.body:
+                    v *= B[b]
+                ps.append(value(v))
+            ps = np.asarray(ps)
+            e = es[rng.choice(len(es), p=ps / ps.sum())]
+            return e, e.body
+        return build(self.root, expand)
@@ -0,0 +1,166 @@
+"""Out-of-core inside evaluation, streamed from disk by topological level.
+
+`save` writes the edges of a `CompiledHypergraph` sorted by the level of
+their head (see `hypergraphs.vectorized`), with the weights lowered to a
+scalar semiring, in the container format of `hypergraphs.storage`.
+`inside` then reads the edges back in blocks of at most `block` edges, in
+order, so only the chart and one block are ever in memory.  A head whose
+edges straddle two blocks is simply summed into twice.
+
+With `frontier=True`, node ids on disk are replaced by slots in a chart that
+only holds the live frontier: a node occupies a slot from its level up to
+the last level that reads it, after which the slot is reused (like register
+allocation).  The chart then has as many entries as the most nodes alive at
+once, and `inside` can only report the root's value.
+
+Writing reads the compiled graph (which may itself be memory-mapped by
+`hypergraphs.storage.load`) with NumPy, and makes no Python objects per node
+or edge.  It holds a handful of NumPy integer arrays with one entry per node
+or per edge (the levels, the sort permutation and the reordered edge
+arrays); it is a one-time conversion.
+"""
+import sys
+import numpy as np
+
+from hypergraphs import vectorized
+from hypergraphs.compiled import _segment_index
+from hypergraphs.storage import _write, _header
+
+
+def save(cg, path, S=None, weight=None, frontier=False):
+    """
+    Write `cg` to `path` for `inside`.  `S` is the scalar semiring (by default
+    the one of `cg.kind`) and `weight` optionally overrides the edge weights
+    (an array in `S`).
+    """
+    if S is None: S = vectorized.scalar_semiring(cg.kind)
+    assert S is not None, f'no scalar semiring for {cg.kind}'
+    w = cg.lower(S) if weight is None else np.asarray(weight, dtype=S.dtype)
+    V = cg.num_nodes
+    lev = vectorized.node_levels(cg)
+    L = int(lev.max()) + 1 if V else 0
+    order = np.lexsort((cg.head, lev[cg.head]))
+    arity = cg.arity[order]
+    body_ptr = np.zeros(len(order)+1, dtype=np.int64)
+    np.cumsum(arity, out=body_ptr[1:])
+    head = cg.head[order]
+    body = cg.body[_segment_index(cg.body_ptr[order], arity)]
+    arrays = {
+        'level_ptr': np.searchsorted(lev[head], np.arange(L+1)),
+        'body_ptr': body_ptr,
+        'weight': w[order],
+    }
+    root = cg.root
+    if frontier:
+        slot, born, born_ptr = _slots(cg, lev, L)
+        head = slot[head]; body = slot[body]
+        arrays['born'] = born; arrays['born_ptr'] = born_ptr
+        num_slots = int(slot.max()) + 1 if V else 0
+        if root is not None: root = int(slot[root])
+    else:
+        num_slots = V
+    arrays['head'] = head.astype(np.int32)
+    arrays['body'] = body.astype(np.int32)
+    _write(path, {
+        'layout': 'levels',
+        'semiring': S.name,
+        'num_nodes': V,
+        'num_edges': cg.num_edges,
+        'num_slots': num_slots,
+        'root': root,
+        'frontier': frontier,
+    }, arrays)
+
+
+def _slots(cg, lev, L):
+    """
+    Assign chart slots to nodes so that nodes alive at the same time never
+    share one.  Returns the slot of each node and, per level, the slots of
+    the nodes born there (`born[born_ptr[l]:born_ptr[l+1]]`).
+    """
+    V = cg.num_nodes
+    last = lev.copy()                   # last level that reads each node
+    np.maximum.at(last, cg.body, np.repeat(lev[cg.head], cg.arity))
+    if cg.root is not None: last[cg.root] = L
+    by_birth = np.argsort(lev, kind='stable')
+    birth_ptr = np.searchsorted(lev[by_birth], np.arange(L+1))
+    by_death = np.argsort(last, kind='stable')
+    death_ptr = np.searchsorted(last[by_death], np.arange(L+1))
+    slot = np.empty(V, dtype=np.int64)
+    free = np.empty(V, dtype=np.int64)  # stack of free slots
+    top = 0
+    n = 0
+    for l in range(L):
+        if l:
+            dead = by_death[death_ptr[l-1]:death_ptr[l]]
+            free[top:top+len(dead)] = slot[dead]; top += len(dead)
+        born = by_birth[birth_ptr[l]:birth_ptr[l+1]]
+        k = min(len(born), top)
+        slot[born[:k]] = free[top-k:top][::-1]; top -= k
+        slot[born[k:]] = np.arange(n, n + len(born) - k); n += len(born) - k
+    return slot, slot[by_birth], birth_ptr
+
+
+def inside(path, block=1 << 20):
+    """
+    Stream the file written by `save` and return `(Z, B, stats)`: the root's
+    inside value, the inside chart indexed by node id (None for a frontier
+    file), and a dict of I/O statistics:
+
+        bytes_read        bytes read from the file
+        blocks, levels    number of blocks and levels
+        chart_bytes       size of the chart
+        peak_block_bytes  largest amount of edge data in memory at once
+        peak_rss          the process's peak resident set size, in bytes
+    """
+    header = _header(path)
+    assert header.get('layout') == 'levels', f'{path} was not written by hypergraphs.outofcore.save'
+    [S] = [S for S in vectorized.SCALARS if S.name == header['semiring']]
+    frontier = header['frontier']
+    stats = dict(bytes_read=0, blocks=0, levels=0, peak_block_bytes=0)
+    with open(path, 'rb') as f:
+        def read(name, start=None, stop=None):
+            offset, dtype, shape = header['arrays'][name]
+            dtype = np.dtype(dtype)
+            if start is None: start, stop = 0, shape[0]
+            f.seek(offset + start * dtype.itemsize)
+            a = np.fromfile(f, dtype=dtype, count=stop - start)
+            stats['bytes_read'] += a.nbytes
+            return a
+        level_ptr = read('level_ptr').tolist()
+        if frontier: born_ptr = read('born_ptr').tolist()
+        B = np.full(header['num_slots'], S.zero, dtype=S.dtype)
+        for l in range(len(level_ptr) - 1):
+            stats['levels'] += 1
+            if frontier:
+                B[read('born', born_ptr[l], born_ptr[l+1])] = S.zero
+            for a in range(level_ptr[l], level_ptr[l+1], block):
+                b = min(a + block, level_ptr[l+1])
+                head = read('head', a, b)
+                w = read('weight', a, b)
+                body_ptr = read('body_ptr', a, b+1)
+                body = read('body', body_ptr[0], body_ptr[-1])
+                stats['blocks'] += 1
+                stats['peak_block_bytes'] = max(stats['peak_block_bytes'],
+                                                head.nbytes + w.nbytes + body_ptr.nbytes + body.nbytes)
+                arity = np.diff(body_ptr)
+                starts = body_ptr[:-1] - body_ptr[0]
+                v = np.empty(b - a, dtype=S.dtype)
+                for k in np.unique(arity).tolist():
+                    pos = np.flatnonzero(arity == k)
+                    rows = body[starts[pos][:, None] + np.arange(k)]
+                    v[pos] = S.times(w[pos], S.times.reduce(B[rows], axis=-1))
+                seg = np.flatnonzero(np.r_[True, head[1:] != head[:-1]])
+                heads = head[seg]
+                B[heads] = S.plus(B[heads], S.plus.reduceat(v, seg))
+    stats['chart_bytes'] = B.nbytes
+    stats['peak_rss'] = _peak_rss()
+    root = header['root']
+    Z = S.zero if root is None else B[root]
+    return Z, (None if frontier else B), stats
+
+
+def _peak_rss():
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024      # kilobytes on Linux
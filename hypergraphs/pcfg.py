@@ -1,5 +1,4 @@
 import numpy as np
-from nltk.tree import ImmutableTree as Tree
 from arsenal.maths import sample
 
 from hypergraphs.hypergraph import Hypergraph
@@ -44,22 +43,24 @@ class WCFG(Hypergraph):
 
 
 class PCFG(WCFG):
-    def sample(self, v=None):
-        "Sample from parse forest."
-        if v is None: v = self.root
-        edges = self.incoming[v]
-        # base case (leaf), nothing to sample
-        if not edges: return v
-        # sample incoming edge, p(e|head) \propto edge.weight * (\prod_{b in e.body} beta[b])
-        ps = [float(e.weight) for e in edges]
-        # sample one of the incoming edges
-        i = sample(ps)
-        e = edges[i]
-        return Tree(v, [self.sample(y) for y in e.body])
 
-    def sample(self):
-        "Sample from parse forest."
-        return PDA(self).run()
+    def sampler(self):
+        "Alias-table sampler for this forest (cached until the next call to `edge`)."
+        if 'sampler' not in self._cache:
+            from hypergraphs.sampler import AliasSampler
+            from hypergraphs.vectorized import REAL
+            cg = self.compile()
+            self._cache['sampler'] = AliasSampler(cg, cg.lower(REAL))
+        return self._cache['sampler']
+
+    def sample(self, n=None, rng=None):
+        """
+        Sample from parse forest: a single tree, or with `n`, a batch of `n`
+        derivations as edge-id arrays (see `hypergraphs.sampler.Samples`).
+        """
+        if n is None:
+            return self.sampler().sample(1, rng).tree(0)
+        return self.sampler().sample(n, rng)
 
 
 from semirings.util import derivation
@@ -0,0 +1,205 @@
+"""Batched ancestral sampling of derivations.
+
+Given, for each edge, its probability conditioned on its head, `n`
+derivations are drawn together, a wave (one level of depth across all
+samples) at a time, as arrays of edge ids.  Two ways to draw an edge:
+
+  - `AliasSampler`: an alias table (Walker, 1977; Vose, 1991) is built once
+    for the incoming edges of every node, flattened into arrays over the
+    `in_edge` order of a `CompiledHypergraph`; drawing then costs one
+    uniform index and one coin flip.  Best for many draws from fixed
+    weights (e.g. a `PCFG`).
+  - `CDFSampler`: each node's normalized cumulative sums over the same
+    order, built with a few vectorized passes and searched by a bisection
+    within each node's slots (all samples at once).  Best when the
+    distribution changes often, e.g. `inside_sampler` derives it from an
+    inside chart after each weight update.
+"""
+import numpy as np
+from nltk.tree import ImmutableTree as Tree
+
+from hypergraphs.compiled import _segment_index
+
+
+class _Sampler:
+
+    def __init__(self, cg, p):
+        """
+        `p` is an array of edge probabilities aligned with the edges of `cg`,
+        normalized (up to rounding) over the incoming edges of each node.
+        """
+        self.cg = cg
+        p = np.asarray(p, dtype=float)
+        assert p.shape == (cg.num_edges,) and (p >= 0).all()
+        with np.errstate(divide='ignore'):
+            self.logp = np.log(p)
+        self.deg = np.diff(cg.in_ptr)
+
+    def sample(self, n, rng=None):
+        "Draw `n` derivations of the root; see `Samples`."
+        if rng is None: rng = np.random.default_rng()
+        cg = self.cg
+        in_edge, deg = cg.in_edge, self.deg
+        sid = np.arange(n)
+        node = np.full(n, cg.root)
+        sids = [sid[:0]]; edges = [sid[:0]]
+        while len(node):
+            d = deg[node]
+            leaf = d == 0
+            if leaf.any():
+                sid = sid[~leaf]; node = node[~leaf]; d = d[~leaf]
+            e = in_edge[self._draw(node, d, rng)]
+            sids.append(sid); edges.append(e)
+            k = cg.arity[e]
+            sid = np.repeat(sid, k)
+            node = cg.body[_segment_index(cg.body_ptr[e], k)]
+        sids = np.concatenate(sids); edges = np.concatenate(edges)
+        order = np.argsort(sids, kind='stable')
+        ptr = np.zeros(n+1, dtype=np.int64)
+        np.cumsum(np.bincount(sids, minlength=n), out=ptr[1:])
+        return Samples(self, ptr, edges[order])
+
+
+class AliasSampler(_Sampler):
+
+    def __init__(self, cg, p):
+        super().__init__(cg, p)
+        self.prob, self.alias = _alias_tables(np.exp(self.logp)[cg.in_edge], cg.in_ptr)
+
+    def _draw(self, node, d, rng):
+        "Positions in `in_edge` of one incoming edge for each of `node` (with `d` edges each)."
+        slot = self.cg.in_ptr[node] + np.minimum((rng.random(len(node)) * d).astype(np.int64), d - 1)
+        return np.where(rng.random(len(node)) < self.prob[slot], slot, self.alias[slot])
+
+
+class CDFSampler(_Sampler):
+
+    def __init__(self, cg, p):
+        super().__init__(cg, p)
+        # Slots in_ptr[v]:in_ptr[v+1] hold node v's cumulative probabilities,
+        # ending at exactly 1.  The prefix sums only add up v's own slots
+        # (log2(degree) doubling passes), so the resolution does not depend
+        # on the number of nodes, as it would with one global cumsum.
+        in_ptr, deg = cg.in_ptr, self.deg
+        c = np.exp(self.logp)[cg.in_edge]
+        pos = np.arange(len(c))
+        start = np.repeat(in_ptr[:-1], deg)
+        maxdeg = int(deg.max(initial=0))
+        self.passes = maxdeg.bit_length()
+        k = 1
+        while k < maxdeg:
+            shifted = np.zeros_like(c); shifted[k:] = c[:-k]
+            c = c + np.where(pos - k >= start, shifted, 0)
+            k *= 2
+        last = in_ptr[1:][deg > 0] - 1
+        with np.errstate(invalid='ignore', divide='ignore'):
+            c /= np.repeat(c[last], deg[deg > 0])
+        c[np.isnan(c)] = 1.0                # nodes without derivations
+        c[last] = 1.0
+        c.setflags(write=False)
+        self.cdf = c
+
+    def _draw(self, node, d, rng):
+        "First slot of each node whose cumulative probability exceeds a uniform draw."
+        u = rng.random(len(node))
+        lo = self.cg.in_ptr[node]
+        hi = lo + d - 1                     # the last slot always qualifies
+        for _ in range(self.passes):
+            mid = (lo + hi) // 2
+            go = self.cdf[mid] <= u
+            lo = np.where(go & (lo < hi), mid + 1, lo)
+            hi = np.where(go, hi, mid)
+        return lo
+
+
+def inside_sampler(cg, S, inside=None, weight=None):
+    """
+    `CDFSampler` for derivations of `cg` in proportion to their weight, with
+    `p(e | head) = w_e * prod_b inside[b] / inside[head]`.  `S` is the
+    vectorized real or log semiring; `inside` and `weight` are arrays in
+    that semiring indexed by node and edge id (computed if omitted).
+    """
+    from hypergraphs import vectorized
+    assert S in (vectorized.REAL, vectorized.LOG), S
+    w = cg.lower(S) if weight is None else np.asarray(weight, dtype=float)
+    B = vectorized.inside(cg, S, w) if inside is None else np.asarray(inside, dtype=float)
+    if S is vectorized.REAL:
+        with np.errstate(divide='ignore'):
+            w = np.log(w); B = np.log(B)
+    items = np.repeat(np.arange(cg.num_edges), cg.arity)
+    with np.errstate(invalid='ignore'):
+        logp = w + np.bincount(items, weights=B[cg.body], minlength=cg.num_edges) - B[cg.head]
+    logp[np.isnan(logp) | (B[cg.head] == -np.inf)] = -np.inf      # heads without derivations
+    return CDFSampler(cg, np.exp(logp))
+
+
+class Samples:
+    """
+    `n` sampled derivations: the edge ids of derivation `i` are
+    `edges[ptr[i]:ptr[i+1]]`, in breadth-first order from the root edge.
+    """
+
+    def __init__(self, sampler, ptr, edges):
+        self.sampler = sampler
+        self.ptr = ptr
+        self.edges = edges
+
+    def __len__(self):
+        return len(self.ptr) - 1
+
+    def __getitem__(self, i):
+        return self.edges[self.ptr[i]:self.ptr[i+1]]
+
+    @property
+    def logprob(self):
+        "Log-probability of each derivation."
+        lp = self.sampler.logp[self.edges]
+        return np.add.reduceat(lp, self.ptr[:-1]) if len(lp) else np.zeros(len(self))
+
+    def tree(self, i):
+        "Derivation `i` as an `nltk` tree over the nodes (leaves are nodes without edges)."
+        cg = self.sampler.cg
+        _, body_ptr, body, in_ptr, _ = cg._lists
+        es = iter(self[i].tolist())
+        queue = [cg.root]
+        kids = []
+        for x in queue:                 # breadth first, like the sampler
+            if in_ptr[x] == in_ptr[x+1]:
+                kids.append(None)
+                continue
+            e = next(es)
+            kids.append(range(len(queue), len(queue) + body_ptr[e+1] - body_ptr[e]))
+            queue.extend(body[body_ptr[e]:body_ptr[e+1]])
+        out = [None] * len(queue)
+        for j in reversed(range(len(queue))):
+            x = cg.nodes[queue[j]]
+            out[j] = x if kids[j] is None else Tree(x, [out[c] for c in kids[j]])
+        return out[0]
+
+
+def _alias_tables(q, ptr):
+    """
+    Alias tables for the distributions `q[ptr[v]:ptr[v+1]]` (Vose's method):
+    from slot `i` of node `v`, keep `i` with probability `prob[i]` and
+    otherwise take `alias[i]` (both are positions into `q`).
+    """
+    prob = np.ones(len(q))
+    alias = np.arange(len(q))
+    ptr = ptr.tolist()
+    for a, b in zip(ptr, ptr[1:]):
+        n = b - a
+        if n < 2: continue
+        total = q[a:b].sum()
+        if total <= 0: continue
+        s = (q[a:b] * (n / total)).tolist()
+        small = [i for i in range(n) if s[i] < 1]
+        large = [i for i in range(n) if s[i] >= 1]
+        while small and large:
+            i = small.pop(); j = large[-1]
+            prob[a+i] = s[i]; alias[a+i] = a+j
+            s[j] -= 1 - s[i]
+            if s[j] < 1:
+                large.pop(); small.append(j)
+        for i in small + large:
+            prob[a+i] = 1.0
+    return prob, alias
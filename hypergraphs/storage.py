@@ -0,0 +1,171 @@
+"""Single-file binary format for compiled hypergraphs and their charts.
+
+Layout (all integers little-endian):
+
+    magic     8 bytes   b'HGRAPH\\0\\0'
+    version   uint32    FORMAT_VERSION
+    length    uint32    length of the header
+    header    JSON      layout, num_nodes, root, kind, semiring and, for
+                        each array, its offset, dtype and shape
+    arrays    each starting at a multiple of `ALIGN` bytes
+
+The arrays are the edges of a `CompiledHypergraph` (`head`, `body_ptr`,
+`body`, `in_edge`, `in_ptr`), the weights in the vectorized semiring of its
+kind (`hypergraphs.vectorized`), any chart arrays passed to `save`, and the
+pickled node table.  `load` maps the arrays with `np.memmap`, so opening a
+file costs a header parse regardless of its size, pages are read on first
+touch, and processes that open the same file share them through the page
+cache.  The node table is only unpickled when it is first used.
+
+The same container, with a different `layout`, holds the level-sorted edges
+of `hypergraphs.outofcore`.
+"""
+import json
+import pickle
+import struct
+from importlib import import_module
+
+import numpy as np
+
+MAGIC = b'HGRAPH\0\0'
+FORMAT_VERSION = 1
+ALIGN = 64
+
+
+def save(cg, path, **charts):
+    """
+    Write the `CompiledHypergraph` `cg` to `path`, along with any named chart
+    arrays (e.g. `inside=B, outside=A`).
+    """
+    from hypergraphs import vectorized
+    if cg.weight.dtype == object:
+        S = vectorized.scalar_semiring(cg.kind)
+        assert S is not None, f'cannot store weights of {cg.kind}'
+        weight, semiring = cg.lower(S), S.name
+    else:
+        weight, semiring = cg.weight, None
+    arrays = {
+        'head': cg.head, 'body_ptr': cg.body_ptr, 'body': cg.body,
+        'in_edge': cg.in_edge, 'in_ptr': cg.in_ptr, 'weight': weight,
+        'nodes': np.frombuffer(pickle.dumps(list(cg.nodes), protocol=pickle.HIGHEST_PROTOCOL), dtype=np.uint8),
+    }
+    for name, chart in charts.items():
+        assert name not in arrays, name
+        arrays[name] = np.asarray(chart)
+    _write(path, {
+        'layout': 'compiled',
+        'num_nodes': cg.num_nodes,
+        'root': cg.root,
+        'kind': None if cg.kind is None else f'{cg.kind.__module__}:{cg.kind.__qualname__}',
+        'semiring': semiring,
+        'charts': list(charts),
+    }, arrays)
+
+
+def _write(path, header, arrays):
+    "Write `header` (a JSON-able dict) and the named `arrays` to `path`."
+    arrays = {k: np.ascontiguousarray(v) for k, v in arrays.items()}
+    header = dict(header, arrays={})
+    # Offsets depend on the header's length, which depends on the offsets;
+    # reserve room for them, then fill them in.
+    for _ in range(2):
+        blob = json.dumps(header).encode()
+        offset = _align(len(MAGIC) + 8 + len(blob) + 64)
+        for k, a in arrays.items():
+            header['arrays'][k] = [offset, a.dtype.str, list(a.shape)]
+            offset = _align(offset + a.nbytes)
+    blob = json.dumps(header).encode()
+    with open(path, 'wb') as f:
+        f.write(MAGIC + struct.pack('<II', FORMAT_VERSION, len(blob)) + blob)
+        for k, a in arrays.items():
+            f.write(b'\0' * (header['arrays'][k][0] - f.tell()))
+            f.write(a.tobytes())
+
+
+def _header(path):
+    "Read and check the header of a file written by `_write`."
+    with open(path, 'rb') as f:
+        magic = f.read(len(MAGIC))
+        assert magic == MAGIC, f'{path} is not a hypergraph file'
+        version, n = struct.unpack('<II', f.read(8))
+        assert version <= FORMAT_VERSION, f'{path} has format version {version}; this code reads up to {FORMAT_VERSION}'
+        return json.loads(f.read(n))
+
+
+def _array(path, header, name, mmap=True):
+    "Array `name` of the file, memory-mapped or read into memory."
+    offset, dtype, shape = header['arrays'][name]
+    if not mmap or not np.prod(shape):
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            return np.fromfile(f, dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+    return np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=tuple(shape))
+
+
+def load(path, mmap=True, lift=False):
+    """
+    Open a file written by `save`; returns `(cg, charts)` where `charts` maps
+    names to arrays.  With `mmap=False` the arrays are read into memory.
+
+    Weights of semirings other than `Float` come back in vectorized form
+    (`cg.lower(S)` is already filled in), which is all the vectorized
+    algorithms need; `lift=True` converts them back to semiring objects for
+    the generic ones.
+    """
+    from hypergraphs import vectorized
+    from hypergraphs.compiled import CompiledHypergraph
+    header = _header(path)
+    assert header.get('layout') == 'compiled', f'{path} does not hold a compiled hypergraph'
+    def array(name): return _array(path, header, name, mmap)
+    kind = header['kind']
+    if kind is not None:
+        module, name = kind.split(':')
+        kind = getattr(import_module(module), name)
+    weight = array('weight')
+    S = None
+    if header['semiring'] is not None:
+        [S] = [S for S in vectorized.SCALARS if S.name == header['semiring']]
+        if lift:
+            weight = np.fromiter(map(S.lift, weight), dtype=object, count=len(weight))
+    cg = CompiledHypergraph(
+        nodes = _Nodes(header['num_nodes'], array('nodes')),
+        head = array('head'),
+        body_ptr = array('body_ptr'),
+        body = array('body'),
+        weight = weight,
+        root = header['root'],
+        kind = kind,
+        in_edge = array('in_edge'),
+        in_ptr = array('in_ptr'),
+    )
+    if S is not None:
+        cg._lowered[S.name] = array('weight')
+    return cg, {name: array(name) for name in header['charts']}
+
+
+class _Nodes:
+    "Node table that is unpickled on first access."
+
+    def __init__(self, n, blob):
+        self.n = n
+        self.blob = blob
+        self._nodes = None
+
+    def _load(self):
+        if self._nodes is None:
+            self._nodes = pickle.loads(self.blob)
+            self.blob = None
+        return self._nodes
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, i):
+        return self._load()[i]
+
+    def __iter__(self):
+        return iter(self._load())
+
+
+def _align(n):
+    return -(-n // ALIGN) * ALIGN
@@ -0,0 +1,263 @@
+"""Vectorized inside/outside for scalar semirings.
+
+The nodes of a `CompiledHypergraph` are grouped into topological levels: a
+node's level is one more than the largest level among the bodies of its
+incoming edges (nodes whose edges are all nullary, and nodes without edges,
+are at level 0).  Every edge's body lies strictly below its head, so each
+level is evaluated at once with NumPy gathers, products over the (arity-
+grouped) bodies, and a segmented `reduceat` over the heads.
+
+Only semirings whose values are NumPy scalars are supported; see `Scalar` and
+`scalar_semiring`.  Charts are arrays indexed by node id.
+
+With `workers=n`, each level is split into chunks of whole head segments that
+are evaluated on a pool of `n` threads (NumPy releases the GIL inside its
+kernels).  Every head is still reduced over the same slice in the same order,
+so the results are bit-identical to the serial path.  In `outside`, the
+per-edge products are computed in parallel but scattered into the chart
+serially, in the serial order, for the same reason.
+"""
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Scalar:
+    """A semiring over a NumPy dtype.
+
+    `times` and `plus` are binary ufuncs; `lower` maps a value of the
+    corresponding `semirings` type to a scalar and `lift` maps it back.
+    """
+
+    def __init__(self, name, dtype, zero, one, times, plus, lower, lift):
+        self.name = name
+        self.dtype = dtype
+        self.zero = zero
+        self.one = one
+        self.times = times
+        self.plus = plus
+        self.lower = lower
+        self.lift = lift
+
+    def __repr__(self):
+        return f'Scalar({self.name})'
+
+
+def _logval(x):
+    from semirings import LogVal
+    return LogVal(True, x)
+
+
+def _log(w):
+    assert w.pos, 'the log semiring does not support negative weights'
+    return w.ell
+
+
+def _maxplus(x):
+    from semirings import MaxPlus
+    return MaxPlus(x)
+
+
+def _minplus(x):
+    from semirings import MinPlus
+    return MinPlus(x)
+
+
+def _boolean(x):
+    from semirings import Boolean
+    return Boolean(x)
+
+
+REAL = Scalar('real', np.float64, 0.0, 1.0, np.multiply, np.add, float, float)
+LOG = Scalar('log', np.float64, -np.inf, 0.0, np.add, np.logaddexp, _log, _logval)
+MAXPLUS = Scalar('maxplus', np.float64, -np.inf, 0.0, np.add, np.maximum, lambda w: w.score, _maxplus)
+MINPLUS = Scalar('minplus', np.float64, np.inf, 0.0, np.add, np.minimum, lambda w: w.cost, _minplus)
+BOOLEAN = Scalar('boolean', np.bool_, False, True, np.logical_and, np.logical_or, lambda w: w.score, _boolean)
+SCALARS = (REAL, LOG, MAXPLUS, MINPLUS, BOOLEAN)
+
+
+def scalar_semiring(kind):
+    "The vectorized counterpart of the semiring `kind`, or None if there isn't one."
+    from semirings import Float, LogVal, MaxPlus, MinPlus, Boolean
+    return {
+        Float: REAL, LogVal: LOG,
+        MaxPlus: MAXPLUS, MinPlus: MINPLUS, Boolean: BOOLEAN,
+    }.get(kind)
+
+
+class Level:
+    """Edges whose heads share a topological level.
+
+    `edges` are sorted by head; `heads[i]` receives the sum over
+    `edges[starts[i]:starts[i+1]]`.  `groups` partitions the edges by arity:
+    each entry `(k, pos, ids, body)` holds the positions in `edges`, the edge
+    ids and the `[n, k]` matrix of body node ids.
+    """
+
+    def __init__(self, cg, edges):
+        head = cg.head[edges]
+        self.edges = edges
+        self.starts = np.flatnonzero(np.r_[True, head[1:] != head[:-1]])
+        self.heads = head[self.starts]
+        arity = cg.arity[edges]
+        self.groups = []
+        for k in np.unique(arity).tolist():
+            pos = np.flatnonzero(arity == k)
+            ids = edges[pos]
+            body = cg.body[cg.body_ptr[ids][:, None] + np.arange(k)]
+            self.groups.append((k, pos, ids, body))
+
+
+MIN_CHUNK = 4096     # fewest edges worth handing to a thread
+
+
+def chunks(cg, level, workers):
+    """
+    Split `level` into at most `workers` `Level`s of about equal size (and at
+    least `MIN_CHUNK` edges), cutting only between head segments.
+    """
+    n = min(workers, len(level.edges) // MIN_CHUNK)
+    if n < 2: return [level]
+    bounds = np.searchsorted(level.starts, np.linspace(0, len(level.edges), n+1)[1:-1])
+    cuts = np.unique(level.starts[bounds[bounds < len(level.starts)]])
+    return [Level(cg, edges) for edges in np.split(level.edges, cuts) if len(edges)]
+
+
+def node_levels(cg, block=1 << 16):
+    """
+    Topological level of each node of `cg`, computed over `block` node ids at
+    a time straight from the edge arrays (which may be memory-mapped).
+    Bodies below the block are done with NumPy; only the dependencies inside
+    the block are resolved one at a time.
+    """
+    from hypergraphs.compiled import _segment_index
+    level = np.zeros(cg.num_nodes, dtype=np.int64)
+    for a in range(0, cg.num_nodes, block):
+        b = min(a + block, cg.num_nodes)
+        edges = cg.in_edge[cg.in_ptr[a]:cg.in_ptr[b]]      # sorted by head
+        arity = cg.body_ptr[edges + 1] - cg.body_ptr[edges]
+        heads = np.repeat(cg.head[edges], arity) - a
+        body = cg.body[_segment_index(cg.body_ptr[edges], arity)]
+        inner = body >= a
+        lev = np.zeros(b - a, dtype=np.int64)
+        np.maximum.at(lev, heads[~inner], level[body[~inner]] + 1)
+        if inner.any():
+            # Ids are topological, so a body precedes its head within the block too.
+            lev = lev.tolist()
+            for x, y in zip(heads[inner].tolist(), (body[inner] - a).tolist()):
+                if lev[y] >= lev[x]: lev[x] = lev[y] + 1
+        level[a:b] = lev
+    return level
+
+
+def levels(cg):
+    "Partition the edges of `cg` into `Level`s, bottom up."
+    lev = node_levels(cg)[cg.head]
+    order = np.lexsort((cg.head, lev))
+    bounds = np.flatnonzero(np.diff(lev[order])) + 1
+    return [Level(cg, edges) for edges in np.split(order, bounds) if len(edges)]
+
+
+def _exclusive(S, X):
+    "Product of all but the `j`th entry along the last axis, for each `j`."
+    Y = np.full_like(X, S.one)
+    if X.shape[-1] > 1:
+        Y[..., 1:] = S.times.accumulate(X[..., :-1], axis=-1)
+        suffix = S.times.accumulate(X[..., :0:-1], axis=-1)[..., ::-1]
+        Y[..., :-1] = S.times(Y[..., :-1], suffix)
+    return Y
+
+
+def inside(cg, S, weight=None, workers=None):
+    """Inside chart of `cg` in the scalar semiring `S`.
+
+    `weight` may carry leading batch dimensions, `[..., num_edges]`; the chart
+    then has shape `[..., num_nodes]`.  `workers` sets the number of threads.
+    """
+    return _inside(cg, S, weight, workers)[0]
+
+
+def _inside(cg, S, weight=None, workers=None):
+    # Also returns the product of the body's inside values for each edge.
+    w = cg.lower(S) if weight is None else np.asarray(weight, dtype=S.dtype)
+    batch = w.shape[:-1]
+    B = np.full(batch + (cg.num_nodes,), S.zero, dtype=S.dtype)
+    P = np.empty(batch + (cg.num_edges,), dtype=S.dtype)
+    def step(level):
+        v = np.empty(batch + (len(level.edges),), dtype=S.dtype)
+        for _, pos, ids, body in level.groups:
+            P[..., ids] = S.times.reduce(B[..., body], axis=-1)
+            v[..., pos] = S.times(w[..., ids], P[..., ids])
+        B[..., level.heads] = S.plus.reduceat(v, level.starts, axis=-1)
+    _run(cg, step, workers)
+    return B, P
+
+
+def outside(cg, S, B, weight=None, workers=None):
+    "Outside chart of `cg` in the scalar semiring `S`, given the inside chart `B` (batched like `inside`)."
+    w = cg.lower(S) if weight is None else np.asarray(weight, dtype=S.dtype)
+    A = np.full(B.shape, S.zero, dtype=S.dtype)
+    A[..., cg.root] = S.one
+    def contributions(level):
+        out = []
+        for k, _, ids, body in level.groups:
+            if k == 0: continue
+            a = S.times(A[..., cg.head[ids]], w[..., ids])
+            out.append((body, S.times(a[..., None], _exclusive(S, B[..., body]))))
+        return out
+    def scatter(results):
+        for body, v in results:
+            S.plus.at(A, (Ellipsis, body), v)
+    if not workers or workers < 2:
+        for level in reversed(cg.levels):
+            scatter(contributions(level))
+        return A
+    with ThreadPoolExecutor(workers) as pool:
+        for parts in reversed(cg.chunked_levels(workers)):
+            if len(parts) == 1:
+                scatter(contributions(parts[0]))
+                continue
+            results = list(pool.map(contributions, parts))
+            # The serial order: by arity, then by position in the level.
+            order = sorted((k, i, j) for i, r in enumerate(results) for j, (body, _) in enumerate(r)
+                           for k in [body.shape[-1]])
+            scatter([results[i][j] for _, i, j in order])
+    return A
+
+
+def _run(cg, step, workers):
+    "Apply `step` to each level, bottom up, splitting levels across `workers` threads."
+    if not workers or workers < 2:
+        for level in cg.levels:
+            step(level)
+        return
+    with ThreadPoolExecutor(workers) as pool:
+        for parts in cg.chunked_levels(workers):
+            if len(parts) == 1:
+                step(parts[0])
+            else:
+                for _ in pool.map(step, parts): pass
+
+
+def grad(cg, theta, log=False):
+    """Gradient of log Z with respect to the edge weights `exp(theta)`.
+
+    With `log=True`, the gradient with respect to `theta` itself, i.e., the
+    expected number of times each edge is used (its marginal).  One inside
+    pass stores each edge's body product `P[e]`; the adjoint of the inside
+    value of node `x` is its outside value `A[x]`, so the gradient is
+    `A[head(e)] * P[e] / Z`.  Computed in the log semiring.
+    """
+    B, P = _inside(cg, LOG, theta)
+    A = outside(cg, LOG, B, theta)
+    # Not `log_marginals - theta`: that is nan for zero-weight edges.
+    g = A[..., cg.head] + P - B[..., cg.root][..., None]
+    if log: g = g + theta
+    return np.exp(g)
+
+
+def log_marginals(cg, theta):
+    """Log of each edge's unnormalized marginal, `A[head(e)] * w_e * P[e]`, and
+    log Z, for log-weights `theta`."""
+    B, P = _inside(cg, LOG, theta)
+    A = outside(cg, LOG, B, theta)
+    return A[..., cg.head] + P + theta, B[..., cg.root]
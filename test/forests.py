@@ -0,0 +1,84 @@
+"""Small parse forests shared by the tests."""
+
+import numpy as np
+
+from semirings import Float, LogVal, MaxPlus
+from hypergraphs.hypergraph import Hypergraph
+from hypergraphs.apps.cky import cky
+from hypergraphs.apps.parser2 import load_grammar
+
+
+# Ambiguous grammar over `a`, `b` and `.`; used with deterministic weights.
+AB = load_grammar("""
+S       X .
+X       X X
+X       X Y
+Y       X X
+X       a
+Y       b
+X       b
+""")
+
+PAPA = load_grammar("""
+S       X .
+X       X X
+X       X Y
+Y       X X
+X       Papa
+X       ate
+X       the
+Y       caviar
+X       with
+X       spoon
+""")
+
+SENTENCE = 'Papa ate the caviar with the spoon .'
+
+# Default map from a real weight to each kind.
+LIFT = {Float: float, LogVal: LogVal.lift, MaxPlus: lambda x: MaxPlus(np.log(x))}
+
+
+def ab_forest(sentence, kind=Float, lift=None):
+    "CKY forest of `sentence` (a string) under `AB`, with weights that depend on the rule and span width."
+    if lift is None: lift = LIFT[kind]
+    def binary(_,X,Y,Z,i,j,k): return lift(1 + 0.1*len(X + Y + Z) + 0.01*(k - i))
+    def unary(_,X,Y,i,k):      return lift(0.5 + 0.1*len(X + Y))
+    def terminal(_,W,i):       return kind.one
+    return cky(sentence.split(), AB, binary, unary, terminal, kind=kind)
+
+
+def papa_forest(kind=Float, lift=None, sentence=SENTENCE, seed=0):
+    "CKY forest of `sentence` under `PAPA`, with weights `lift(u)` for uniform random `u`."
+    if lift is None: lift = LIFT[kind]
+    rng = np.random.default_rng(seed)
+    def binary(_,X,Y,Z,i,j,k): return lift(rng.uniform())
+    def unary(_,X,Y,i,k):      return lift(rng.uniform())
+    def terminal(_,W,i):       return kind.one
+    return cky(sentence.split(), PAPA, binary, unary, terminal, kind=kind)
+
+
+def reweighted(g, weight):
+    "Copy of `g` with the edge weights `weight`, aligned with `g.edges`."
+    if isinstance(weight, np.ndarray): weight = weight.tolist()
+    h = Hypergraph(g.root, g.kind)
+    for e, w in zip(g.edges, weight):
+        h.edge(w, e.head, *e.body)
+    return h
+
+
+def chain(n, w, kind):
+    "The unary chain `n <- n-1 <- ... <- 0`, every edge with weight `w`."
+    g = Hypergraph(root=n, kind=kind)
+    g.edge(w, 0)
+    for i in range(1, n + 1):
+        g.edge(w, i, i - 1)
+    return g
+
+
+def depth(d):
+    "Depth of a unary derivation, without recursion."
+    n = 0
+    while d[1:]:
+        _, d = d
+        n += 1
+    return n
@@ -0,0 +1,93 @@
+"""Tests for agenda-driven best-first search."""
+
+import numpy as np
+
+from semirings import MaxPlus, MinPlus
+from hypergraphs.hypergraph import Edge
+from hypergraphs.agenda import Agenda, best_first
+from hypergraphs.apps.matrix_chain import matrix_chain
+
+from forests import papa_forest, chain, depth
+
+
+def score(d):
+    e, *ds = d
+    return e.weight.score + sum(score(d) for d in ds)
+
+
+def test_matches_inside():
+    g = papa_forest(MaxPlus)
+    v, d = g.best_first()
+    assert v == g.Z()
+    assert d[0].head == g.root
+    assert np.isclose(score(d), v.score)
+    assert best_first(matrix_chain([10, 30, 5, 60], MinPlus))[0].cost == 4500
+
+
+def test_astar():
+    g = papa_forest(MaxPlus)
+    A = g.outside(g.inside())
+    plain = Agenda(g); v = plain.run()
+    astar = Agenda(g, heuristic=lambda x: A[x]); w = astar.run()
+    assert v == w
+    assert astar.pops < plain.pops <= len(g.nodes)
+    # With the exact outside values as the heuristic, only nodes on optimal
+    # derivations are popped.
+    assert all(np.isclose(A[x].score + astar.chart[x].score, v.score) for x in astar.chart)
+
+
+class Numbers:
+    "Shortest sequence of `n+1` and `2n` steps from 1 to `root`; infinite."
+    kind = MinPlus
+
+    def __init__(self, root):
+        self.root = root
+
+    def axioms(self):
+        yield Edge(MinPlus.one, 1, ())
+
+    def outgoing(self, n):
+        yield Edge(MinPlus(1), n + 1, (n,))
+        yield Edge(MinPlus(1), 2 * n, (n,))
+
+
+def bfs(root):
+    "Breadth-first distance from 1 to `root`."
+    dist = {1: 0}; frontier = [1]; d = 0
+    while root not in dist:
+        d += 1
+        frontier = {m for n in frontier for m in (n+1, 2*n) if m not in dist}
+        dist.update(dict.fromkeys(frontier, d))
+    return dist[root]
+
+
+def test_infinite_graph():
+    for root in [1, 7, 100, 1023]:
+        a = Agenda(Numbers(root))
+        assert a.run().cost == bfs(root)
+        assert len(list(iter_edges(a.derivation()))) == bfs(root) + 1
+
+
+def iter_edges(d):
+    e, *ds = d
+    yield e
+    for d in ds:
+        yield from iter_edges(d)
+
+
+def test_underivable_root():
+    g = matrix_chain([10, 30, 5, 60], MinPlus)
+    assert best_first(g, root='nowhere') == (None, None)
+
+
+def test_deep_derivation():
+    v, d = chain(5000, MaxPlus(-1.0), MaxPlus).best_first()
+    assert v.score == -5001 and depth(d) == 5000
+
+
+if __name__ == '__main__':
+    funcs = [f for name, f in sorted(globals().items()) if name.startswith('test_')]
+    for f in funcs:
+        f()
+        print(f'ok  {f.__name__}')
+    print(f'\n{len(funcs)} passed')
@@ -0,0 +1,100 @@
+"""Tests for binarization of n-ary hyperedges."""
+
+import numpy as np
+
+from semirings import Float, MaxPlus
+from hypergraphs.hypergraph import Hypergraph
+from hypergraphs.binarize import Span
+
+
+def nary(kind=Float, seed=0):
+    "A random forest over nodes (level, i) with edges of arity up to 5."
+    rng = np.random.default_rng(seed)
+    lift = float if kind is Float else kind
+    g = Hypergraph(root=(4, 0), kind=kind)
+    for i in range(4):
+        g.edge(lift(rng.uniform(0.5, 1.5)), (0, i))
+    for l in range(1, 5):
+        for i in range(1 if l == 4 else 3):
+            for _ in range(3):
+                k = int(rng.integers(1, 6))
+                # Reuse a common first child, so prefixes are shared.
+                body = [(l-1, 0)] + [(l-1, int(j)) for j in rng.integers(0, 3 if l > 1 else 4, size=k-1)]
+                g.edge(lift(rng.uniform(0.5, 1.5)), (l, i), *body)
+    return g
+
+
+DIRECTIONS = [('left', None), ('right', None), ('head', lambda e: len(e.body) // 2)]
+
+
+def test_equivalent():
+    g = nary()
+    # Each derivation counted once: unit weights give the number of derivations.
+    c = Hypergraph(g.root, Float)
+    for e in g.edges: c.edge(1.0, e.head, *e.body)
+    for direction, head in DIRECTIONS:
+        h = g.binarize(direction, head)
+        assert all(len(e.body) <= 2 for e in h.edges)
+        assert np.isclose(h.Z(), g.Z()), direction
+        assert c.binarize(direction, head).Z() == c.Z()
+        assert len(h.origin) == len(h.edges)
+        assert sorted(j for j in h.origin if j is not None) == list(range(len(g.edges)))
+        # One edge into each intermediate node.
+        spans = [e.head for e in h.edges if isinstance(e.head, Span)]
+        assert len(spans) == len(set(spans))
+
+
+def test_shared_prefixes():
+    g = Hypergraph(root='r', kind=Float)
+    for x in 'abcd': g.edge(1.0, x)
+    g.edge(2.0, 'r', 'a', 'b', 'c')
+    g.edge(3.0, 'r', 'a', 'b', 'd')
+    g.edge(5.0, 'r', 'a', 'b', 'c', 'd')
+    h = g.binarize('left')
+    assert [e.head for e in h.edges if isinstance(e.head, Span)] \
+        == [Span(('a', 'b')), Span(('a', 'b', 'c'))]
+    assert h.Z() == g.Z() == 10.0
+
+
+def test_marginals():
+    g = nary()
+    want = g.grad(log=True)
+    for direction, head in DIRECTIONS:
+        h = g.binarize(direction, head)
+        assert np.allclose(h.to_source(h.grad(log=True)), want)
+
+
+def test_derivations():
+    g = nary(MaxPlus, seed=3)
+    value, d = g.viterbi()
+    for direction, head in DIRECTIONS:
+        h = g.binarize(direction, head)
+        v, dh = h.viterbi()
+        assert np.isclose(v.score, value.score)
+        assert h.unbinarize(dh) == d
+
+
+
+def test_deep_derivation():
+    # Ternary chain r = 3000 <- a 2999 a <- ... <- a 0 a: deeper than the recursion limit.
+    g = Hypergraph(root=3000, kind=MaxPlus)
+    g.edge(MaxPlus(0.0), 'a'); g.edge(MaxPlus(0.0), 0)
+    for i in range(1, 3001):
+        g.edge(MaxPlus(-1.0), i, 'a', i - 1, 'a')
+    h = g.binarize('left')
+    v, d = h.viterbi()
+    assert v.score == -3000
+    d = h.unbinarize(d)
+    n = 0
+    while len(d) == 4:
+        assert d[0] == g.edges[-1 - n] and d[1] == d[3] == (g.edges[0],)
+        d = d[2]; n += 1
+    assert n == 3000 and d == (g.edges[1],)
+
+
+if __name__ == '__main__':
+    funcs = [f for name, f in sorted(globals().items()) if name.startswith('test_')]
+    for f in funcs:
+        f()
+        print(f'ok  {f.__name__}')
+    print(f'\n{len(funcs)} passed')
@@ -200,6 +200,54 @@ def test_subset_graph_edge_count():
     assert len(g.edges) == N + 2 * K * N
 
 
+
+# --- long products and bulk edges -----------------------------------------
+
+def test_long_and_nested_products():
+    g = HypergraphBuilder(Float)
+    for x in 'abcdef':
+        g[x] = 1.0
+    g['h'] += 2.0 * g['a'] * g['b'] * 3.0 * g['c'] * g['d'] * g['e'] * g['f']
+    g['k'] += (g['a'] * g['b']) * (5.0 * (g['c'] * g['d']))
+    es = {e.head: e for e in g.edges}
+    assert es['h'].body == tuple('abcdef') and es['h'].weight == 6.0
+    assert es['k'].body == tuple('abcd') and es['k'].weight == 5.0
+    # Products are not mutated when reused.
+    p = g['a'] * g['b']
+    g['m'] += p * g['c']
+    g['m'] += p
+    assert [e.body for e in g.edges if e.head == 'm'] == [('a', 'b', 'c'), ('a', 'b')]
+
+
+def test_add_edges():
+    g = HypergraphBuilder(Float, root=(2, 4))
+    want = HypergraphBuilder(Float, root=(2, 4))
+    nodes = [(k, n) for k in range(3) for n in range(5)]
+    index = {x: i for i, x in enumerate(nodes)}
+    heads = []; bodies = []; weights = []
+    for n in range(4):
+        want[0, n] = 1.0
+        heads.append(index[0, n]); bodies.append(()); weights.append(1.0)
+    for k in range(1, 3):
+        for n in range(4):
+            want[k, n+1] += want[k, n]
+            want[k, n+1] += (n + 1.0) * want[k-1, n]
+            heads += [index[k, n+1]] * 2
+            bodies += [[index[k, n]], [index[k-1, n]]]
+            weights += [1.0, n + 1.0]
+    g.add_edges(np.array(heads), bodies, np.array(weights), nodes=nodes)
+    assert [tuple(e) for e in g.edges] == [tuple(e) for e in want.edges]
+    assert g.Z() == want.Z()
+    # Keys directly, with a 2-d body array.
+    h = HypergraphBuilder(Float, root='r')
+    h.add_edges(['a', 'b'], [(), ()], [2.0, 3.0])
+    h.add_edges(np.array([0]), np.array([[1, 2]]), [0.5], nodes=['r', 'a', 'b'])
+    assert h.edges[-1].body == ('a', 'b')
+    assert h.Z() == 0.5 * 2.0 * 3.0
+    f = HypergraphBuilder(Float, root='r').fuse()
+    f.add_edges(['a', 'b', 'r'], [(), (), ('a', 'b')], [2.0, 3.0, 0.5])
+    assert f.Z() == h.Z()
+
 if __name__ == '__main__':
     funcs = [f for name, f in sorted(globals().items()) if name.startswith('test_')]
     for f in funcs:
@@ -0,0 +1,132 @@
+"""Tests for the array-backed `CompiledHypergraph`."""
+
+import numpy as np
+
+from semirings import Float, MinPlus
+from hypergraphs.hypergraph import Hypergraph
+from hypergraphs.apps.matrix_chain import matrix_chain
+
+from forests import papa_forest, reweighted
+
+
+def assert_charts_close(C, cg, values):
+    # `Hypergraph` charts only cover the nodes below the root.
+    for x in C:
+        assert np.allclose(C[x], values[cg.index[x]]), (x, C[x], values[cg.index[x]])
+
+
+def test_ids_are_topological():
+    cg = papa_forest().compile()
+    for e in range(cg.num_edges):
+        for b in cg.body[cg.body_ptr[e]:cg.body_ptr[e+1]]:
+            assert b < cg.head[e]
+
+
+def test_edges_aligned():
+    g = papa_forest()
+    cg = g.compile()
+    for e, edge in enumerate(g.edges):
+        assert cg.nodes[cg.head[e]] == edge.head
+        assert tuple(cg.nodes[b] for b in cg.body[cg.body_ptr[e]:cg.body_ptr[e+1]]) == edge.body
+        assert cg.weight[e] == edge.weight
+
+
+def test_inside_outside():
+    g = papa_forest()
+    cg = g.compile()
+    B = g.inside(); A = g.outside(B)
+    b = cg.inside(); a = cg.outside(b)
+    assert_charts_close(B, cg, b)
+    assert_charts_close(A, cg, a)
+    assert np.allclose(cg.Z(), g.Z())
+    assert cg.to_chart(b)[g.root] == b[cg.root]
+
+
+def test_numeric_weights():
+    g = papa_forest()
+    cg = g.compile(dtype=np.float32)
+    assert cg.weight.dtype == np.float32
+    assert np.allclose(cg.Z(), g.Z(), rtol=1e-5)
+
+
+def test_insideout():
+    g = papa_forest()
+    cg = g.compile()
+    B = g.inside(); A = g.outside(B)
+    b = cg.inside(); a = cg.outside(b)
+    # expected number of edges in a derivation (times Z)
+    want = g.insideout(B, A, lambda e: e.weight, 0.0)
+    have = cg.insideout(b, a, lambda e: cg.weight[e], 0.0)
+    assert np.allclose(want, have)
+
+
+def test_matrix_chain():
+    cg = matrix_chain([10, 30, 5, 60], MinPlus).compile()
+    assert cg.Z().cost == 4500
+
+
+def test_prune_topo():
+    g = Hypergraph(root='r', kind=Float)
+    g.edge(1.0, 'a')
+    g.edge(2.0, 'r', 'a', 'b')         # 'b' has no derivations
+    g.edge(3.0, 'r', 'a', 'c')
+    g.edge(4.0, 'c', 'a')
+    g.edge(5.0, 'd', 'a')              # 'd' is not reachable from the root
+    g.edge(6.0, 'c', 'e')              # 'e' has no derivations
+    want = {(e.head, e.body) for e in g.prune_topo().edges}
+    p = g.compile().prune_topo()
+    have = {(e.head, e.body) for e in p.hypergraph().edges}
+    assert want == have == {('a', ()), ('r', ('a', 'c')), ('c', ('a',))}
+    assert p.Z() == g.Z() == 12.0
+
+
+def test_with_weights():
+    from hypergraphs import vectorized
+    g = papa_forest()
+    cg = g.compile()
+    rng = np.random.default_rng(1)
+    w = rng.uniform(size=len(g.edges))
+    view = g.with_weights(w.tolist())
+    # Shares the topology and its derived structures, even those computed later.
+    assert view.head is cg.head and view.nodes is cg.nodes and view.levels is cg.levels
+    assert view.with_weights(w.tolist()).index is cg.index and view.base is cg
+    assert cg.weight[0] == g.edges[0].weight
+    want = reweighted(g, w)
+    assert np.isclose(view.Z(), want.Z())
+    # Numeric weights in a vectorized semiring, updated in place.
+    view = cg.with_weights(np.log(w), semiring=vectorized.LOG)
+    assert np.isclose(vectorized.inside(view, vectorized.LOG)[cg.root], np.log(want.Z()))
+    view.set_weights(np.log(2 * w), semiring=vectorized.LOG)
+    assert view.head is cg.head
+    want = reweighted(g, 2 * w)
+    assert np.isclose(vectorized.inside(view, vectorized.LOG)[cg.root], np.log(want.Z()))
+    # Other semiring values.
+    view = cg.with_weights([MinPlus(x) for x in -np.log(w)], kind=MinPlus)
+    assert view.kind is MinPlus and cg.kind is Float
+    assert np.isclose(view.Z().cost, vectorized.inside(cg, vectorized.MINPLUS, -np.log(w))[cg.root])
+    # The cached `g.compile()` must stay in sync with `g.edges`.
+    try:
+        cg.set_weights(w.tolist())
+    except AssertionError:
+        pass
+    else:
+        raise AssertionError('expected failure')
+
+
+def test_cycle_rejected():
+    g = Hypergraph(root='a', kind=Float)
+    g.edge(1.0, 'a', 'b')
+    g.edge(1.0, 'b', 'a')
+    try:
+        g.compile()
+    except AssertionError:
+        return
+    assert False, 'compiling a cyclic hypergraph should have raised'
+
+
+if __name__ == '__main__':
+    funcs = [f for name, f in sorted(globals().items()) if name.startswith('test_')]
+    for f in funcs:
+        f()
+        print(f'ok  {f.__name__}')
+    print(f'\n{len(funcs)} passed')
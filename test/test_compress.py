@@ -0,0 +1,88 @@
+"""Tests for forest compression."""
+
+import numpy as np
+
+from semirings import Float, LogVal, MaxPlus
+from hypergraphs.hypergraph import Hypergraph
+from hypergraphs.compress import Chain, Merge
+
+from forests import ab_forest, chain, depth
+
+
+def small(kind=Float):
+    lift = float if kind is Float else kind.lift if kind is LogVal else kind
+    g = Hypergraph(root='r', kind=kind)
+    g.edge(lift(1.5), 'a'); g.edge(lift(0.5), 'b')
+    # A unary chain r <- c3 <- c2 <- c1 <- a.
+    g.edge(lift(2.0), 'c1', 'a'); g.edge(lift(3.0), 'c2', 'c1'); g.edge(lift(0.5), 'c3', 'c2')
+    g.edge(lift(1.0), 'r', 'c3', 'b')
+    # Parallel edges.
+    g.edge(lift(0.25), 'r', 'a', 'b'); g.edge(lift(0.75), 'r', 'a', 'b')
+    # Identical sub-forests d1 and d2.
+    for d in ['d1', 'd2']:
+        g.edge(lift(2.0), d, 'a'); g.edge(lift(0.1), d, 'b', 'a')
+    g.edge(lift(0.3), 'r', 'd1', 'b', 'd2')
+    return g
+
+
+def test_small():
+    g = small()
+    h = g.compress(hashcons=True)
+    assert h.stats['hashconsed'] == 1 and h.stats['contracted'] == 2 and h.stats['merged'] == 1
+    assert h.stats['edges'] == (13, 8) and np.isclose(h.ratio, 8/13)
+    assert np.isclose(h.Z(), g.Z())
+    assert Chain(4, Chain(3, 2)) in h.origin
+    assert any(isinstance(o, Merge) for o in h.origin)
+    assert h.canonical == {'d2': 'd1'}
+    assert np.allclose(h.to_source(h.grad(log=True)), g.grad(log=True))
+    # Without merging or hash-consing.
+    h = g.compress(merge=False)
+    assert h.stats['edges'] == (13, 11) and np.isclose(h.Z(), g.Z())
+    assert np.allclose(h.to_source(h.grad(log=True)), g.grad(log=True))
+    assert 'compress: ' in h.report()
+
+
+def test_forest():
+    for kind in [Float, LogVal]:
+        g = ab_forest('a b a a b .', kind)
+        want = g.grad(log=True)
+        for hashcons in [False, True]:
+            h = g.compress(hashcons=hashcons)
+            assert h.ratio < 1
+            assert np.isclose(h.Z().ell if kind is LogVal else h.Z(),
+                              g.Z().ell if kind is LogVal else g.Z())
+            assert np.allclose(h.to_source(h.grad(log=True)), want)
+
+
+def test_derivations():
+    g = small(MaxPlus)
+    value, d = g.viterbi()
+    for hashcons in [False, True]:
+        h = g.compress(hashcons=hashcons)
+        v, dh = h.viterbi()
+        assert np.isclose(v.score, value.score)
+        assert h.expand(dh) == d
+    # The best derivation uses the hash-consed copy d2.
+    g.edge(MaxPlus(100.0), 'r', 'd2')
+    value, d = g.viterbi()
+    h = g.compress(hashcons=True)
+    assert h.expand(h.viterbi()[1]) == d
+
+
+
+def test_deep_chain():
+    g = chain(3000, MaxPlus(-1.0), MaxPlus)
+    h = g.compress()
+    assert h.stats['edges'] == (3001, 1)
+    assert depth(h.expand(h.viterbi()[1])) == 3000
+    g = chain(3000, 1.0, Float)
+    h = g.compress()
+    assert np.allclose(h.to_source(h.grad(log=True)), 1)
+
+
+if __name__ == '__main__':
+    funcs = [f for name, f in sorted(globals().items()) if name.startswith('test_')]
+    for f in funcs:
+        f()
+        print(f'ok  {f.__name__}')
+    print(f'\n{len(funcs)} passed')
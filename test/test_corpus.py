@@ -0,0 +1,89 @@
+"""Tests for corpus-level inference on a process pool."""
+
+import numpy as np
+from functools import partial
+
+from semirings import Float, LogVal
+from hypergraphs.pcfg import WCFG
+from hypergraphs.corpus import map_inside, imap_sum_product, expected_counts
+
+from forests import ab_forest
+
+
+def rule(e):
+    "Grammar rule of a CKY edge: labels of the head and body."
+    return (e.head[2], *(b[2] for b in e.body))
+
+
+def forest(seed, kind=Float):
+    rng = np.random.default_rng(seed)
+    sentence = rng.choice(['a', 'b'], size=rng.integers(2, 7)).tolist() + ['.']
+    g = ab_forest(' '.join(sentence), kind)
+    h = WCFG(g.root, kind)
+    for e in g.edges: h.edge(e.weight, e.head, *e.body)
+    return h
+
+
+def brute(g):
+    "log Z and expected rule counts, one graph at a time."
+    B, A = g.sum_product()
+    M = g.edge_marginals(B, A)
+    Z = B[g.root]
+    counts = {}
+    for e in g.edges:
+        counts[rule(e)] = counts.get(rule(e), 0) + M[e] / Z
+    return np.log(Z), counts
+
+
+def assert_counts_close(a, b):
+    for k in set(a) | set(b):
+        assert np.isclose(a.get(k, 0), b.get(k, 0)), k
+
+
+def test_in_process_and_pool():
+    graphs = [forest(s) for s in range(12)]
+    want = [brute(g) for g in graphs]
+    for processes in [0, 2]:
+        Z = list(map_inside(graphs, processes=processes, window=3))
+        assert np.allclose(Z, [z for z, _ in want])
+        for (z, c), (wz, wc) in zip(imap_sum_product(graphs, rule, processes=processes, window=3), want):
+            assert np.isclose(z, wz)
+            assert_counts_close(c, wc)
+        total, counts = expected_counts(graphs, rule, processes=processes, batch=5)
+        assert np.isclose(total, sum(z for z, _ in want))
+        summed = {}
+        for _, c in want:
+            for k, v in c.items(): summed[k] = summed.get(k, 0) + v
+        assert_counts_close(counts, summed)
+
+
+def test_builders_and_logval():
+    # Builders run in the workers (and apply `key` there).
+    builders = [partial(forest, s, LogVal) for s in range(4)]
+    want = [brute(forest(s)) for s in range(4)]
+    for (z, c), (wz, wc) in zip(imap_sum_product(builders, rule, processes=2), want):
+        assert np.isclose(z, wz)
+        assert_counts_close(c, wc)
+    # Without a key: per-edge marginals, aligned with `g.edges`.
+    g = forest(0)
+    [(z, m)] = imap_sum_product([g], processes=0)
+    assert np.allclose(m, g.grad(log=True))
+
+
+
+def test_parent_does_not_compile():
+    # The parent only interns the nodes; the chart's node ids still agree
+    # with `g.compile()`.
+    g = forest(3)
+    [B] = map_inside([g], processes=0, chart=True)
+    assert not g._cache
+    with np.errstate(divide='ignore'):
+        assert np.allclose(B, np.log(np.array(g.compile().inside(), dtype=float)))
+
+
+if __name__ == '__main__':
+    funcs = [f for name, f in sorted(globals().items()) if name.startswith('test_')]
+    for f in funcs:
+        f()
+        print(f'ok  {f.__name__}')
+    print(f'\n{len(funcs)} passed')
@@ -0,0 +1,82 @@
+"""Tests for cube pruning."""
+
+import numpy as np
+
+from semirings import MaxPlus
+from hypergraphs.hypergraph import Hypergraph
+from hypergraphs.cube import cube_prune
+
+from forests import SENTENCE, papa_forest, chain, depth
+
+
+def bigram(a, b):
+    "A made-up non-local score between adjacent words."
+    return -abs(len(a) - len(b)) / 2
+
+
+def combine(e, states):
+    "State: first and last word of the span; scores the bigrams at the seams."
+    if not states: return MaxPlus.one, (e.head[2], e.head[2])
+    s = sum(bigram(l[1], r[0]) for l, r in zip(states, states[1:]))
+    return MaxPlus(s), (states[0][0], states[-1][1])
+
+
+def words(d):
+    e, *ds = d
+    return [e.head[2]] if not ds else [w for d in ds for w in words(d)]
+
+
+def total(d):
+    "Local plus non-local score of a derivation, recomputed from scratch."
+    e, *ds = d
+    ws = [words(d) for d in ds]
+    return (e.weight.score + sum(total(d) for d in ds)
+            + sum(bigram(l[-1], r[0]) for l, r in zip(ws, ws[1:])))
+
+
+def test_without_nonlocal_is_kbest():
+    g = papa_forest(MaxPlus)
+    k = [v.score for v, _ in g.kbest(15)]
+    hyps = cube_prune(g, 15)[g.root]
+    assert np.allclose([-h.cost for h in hyps], k)
+    v, _ = g.cube_prune(1)
+    assert v == g.Z()
+
+
+def test_nonlocal():
+    g = papa_forest(MaxPlus)
+    exact = max(total(d) for _, d in g.kbest())
+    v, d = g.cube_prune(1000, combine)
+    assert np.isclose(v.score, exact) and np.isclose(total(d), exact)
+    assert words(d) == SENTENCE.split()
+    for beam in [1, 2, 5]:
+        v, d = g.cube_prune(beam, combine)
+        assert np.isclose(total(d), v.score) and v.score <= exact + 1e-10
+        assert all(len(hs) <= beam for hs in cube_prune(g, beam, combine).values())
+
+
+def test_later_pop_is_better():
+    # Using `a`'s best edge costs 10 non-locally, so the second pop at `r` wins.
+    g = Hypergraph(root='r', kind=MaxPlus)
+    g.edge(MaxPlus(0.0), 'a'); g.edge(MaxPlus(-1.0), 'a'); g.edge(MaxPlus(0.0), 'b')
+    g.edge(MaxPlus.one, 'r', 'a', 'b')
+    def combine(e, states):
+        if e.head == 'a': return MaxPlus.one, e.weight.score
+        if e.head == 'r': return MaxPlus(-10.0 if states[0] == 0 else 0.0), None
+        return MaxPlus.one, None
+    v, d = g.cube_prune(4, combine)
+    assert v.score == -1 and d[1][0].weight.score == -1
+    assert [h.cost for h in cube_prune(g, 4, combine)['r']] == [1.0]
+
+
+def test_deep_derivation():
+    v, d = chain(5000, MaxPlus(-1.0), MaxPlus).cube_prune(2)
+    assert v.score == -5001 and depth(d) == 5000
+
+
+if __name__ == '__main__':
+    funcs = [f for name, f in sorted(globals().items()) if name.startswith('test_')]
+    for f in funcs:
+        f()
+        print(f'ok  {f.__name__}')
+    print(f'\n{len(funcs)} passed')
@@ -0,0 +1,86 @@
+"""Tests for the cyclic solver."""
+
+import numpy as np
+
+from semirings import Float, MinPlus, MaxPlus
+from hypergraphs.hypergraph import Hypergraph
+from hypergraphs.cyclic import sccs
+from hypergraphs.apps.matrix_chain import matrix_chain
+
+
+def unary_cycles(kind, lift):
+    g = Hypergraph(root='S', kind=kind)
+    g.edge(lift(1.0), 'a')
+    g.edge(lift(0.5), 'X', 'a')
+    g.edge(lift(0.2), 'X', 'Y')
+    g.edge(lift(0.3), 'Y', 'X')
+    g.edge(lift(0.1), 'Y', 'Y')
+    g.edge(lift(0.4), 'S', 'X', 'Y')
+    return g
+
+
+def test_sccs():
+    g = unary_cycles(Float, float)
+    assert sccs(g) == [['a'], ['X', 'Y'], ['S']]
+    g = matrix_chain([10, 30, 5, 60, 8], MinPlus)
+    assert all(len(c) == 1 for c in sccs(g))
+    assert [c[0] for c in sccs(g)] == list(g.toposort())
+
+
+def test_linear():
+    # X = 0.5 + 0.2 Y, Y = 0.3 X + 0.1 Y
+    X = 0.5 / (1 - 0.2*0.3/0.9); Y = 0.3*X/0.9
+    for method in [None, 'kleene', 'newton', 'fixpoint']:
+        B = unary_cycles(Float, float).solve(method)
+        assert np.allclose([B['X'], B['Y'], B['S']], [X, Y, 0.4*X*Y]), method
+
+
+def test_nonlinear():
+    # x = q + p x^2 has least solution (1 - sqrt(1 - 4pq)) / 2p
+    p, q = 0.5, 0.25
+    g = Hypergraph(root='x', kind=Float)
+    g.edge(q, 'x')
+    g.edge(p, 'x', 'x', 'x')
+    want = (1 - np.sqrt(1 - 4*p*q)) / (2*p)
+    assert np.isclose(g.solve()['x'], want)
+    assert np.isclose(g.solve('fixpoint')['x'], want)
+    try:
+        g.solve('kleene')
+    except AssertionError:
+        pass
+    else:
+        assert False, 'kleene should reject a nonlinear cycle'
+
+
+def test_idempotent():
+    # Shortest paths with a cycle, and a nonlinear max-plus system.
+    g = Hypergraph(root='c', kind=MinPlus)
+    g.edge(MinPlus(0), 'a')
+    g.edge(MinPlus(5), 'c', 'a')
+    g.edge(MinPlus(1), 'b', 'a')
+    g.edge(MinPlus(1), 'c', 'b')
+    g.edge(MinPlus(1), 'b', 'c')
+    for method in [None, 'newton', 'fixpoint']:
+        B = g.solve(method)
+        assert (B['b'].cost, B['c'].cost) == (1, 2), method
+    g = Hypergraph(root='x', kind=MaxPlus)
+    g.edge(MaxPlus(-1.0), 'x')
+    g.edge(MaxPlus(-3.0), 'x', 'x', 'y')
+    g.edge(MaxPlus(-0.5), 'y', 'x')
+    g.edge(MaxPlus(-2.0), 'y', 'y', 'x')
+    assert g.solve()['x'] == g.solve('fixpoint')['x'] == MaxPlus(-1.0)
+    assert g.solve()['y'] == MaxPlus(-1.5)
+
+
+def test_acyclic_matches_inside():
+    g = matrix_chain([10, 30, 5, 60, 8], MinPlus)
+    B = g.inside(); C = g.solve()
+    assert set(B) == set(C) and all(B[x] == C[x] for x in B)
+
+
+if __name__ == '__main__':
+    funcs = [f for name, f in sorted(globals().items()) if name.startswith('test_')]
+    for f in funcs:
+        f()
+        print(f'ok  {f.__name__}')
+    print(f'\n{len(funcs)} passed')
@@ -252,6 +252,13 @@ def test():
         dump(v)
         check_equal(Q, v)
 
+        # The same totals as one sparse mat-vec over the edges.
+        keys = sorted({k for e in fog.edges for k in e.weight.s})
+        F = np.array([[e.weight.s[k].to_real() for k in keys] for e in fog.edges])
+        s = fog.feature_totals(F, B, A, value=lambda k: (k.p.to_real(), k.r.to_real()))
+        for i, k in enumerate(keys):
+            assert np.allclose(s[i], [v.s[k].to_real(), v.t[k].to_real()])
+
 
 if __name__ == '__main__':
     test()
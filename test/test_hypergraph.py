@@ -0,0 +1,247 @@
+"""Tests for core `Hypergraph` algorithms."""
+
+import io
+import numpy as np
+from contextlib import redirect_stdout
+
+from semirings import Float, Chart
+from hypergraphs.hypergraph import Hypergraph
+
+from forests import chain, depth
+
+
+def recursive_toposort(g):
+    visited = set()
+    def t(v):
+        if v not in visited:
+            visited.add(v)
+            if g.incoming.get(v):
+                for e in g.incoming[v]:
+                    for u in e.body:
+                        yield from t(u)
+                yield v
+    return list(t(g.root))
+
+
+def diamond():
+    g = Hypergraph(root='r', kind=Float)
+    g.edge(1.0, 'a')
+    g.edge(2.0, 'b', 'a', 'x')
+    g.edge(3.0, 'c', 'a')
+    g.edge(4.0, 'r', 'b', 'c')
+    g.edge(5.0, 'r', 'c', 'c')
+    return g
+
+
+# --- toposort ---------------------------------------------------------------
+
+def test_toposort_long_chain():
+    g = chain(50_000, 1.0, Float)
+    order = g.toposort()
+    assert order == tuple(range(50_001))
+    assert g.Z() == 1.0
+
+
+def test_toposort_matches_recursive_order():
+    g = diamond()
+    assert list(g.toposort()) == recursive_toposort(g) == ['a', 'b', 'c', 'r']
+
+
+def test_toposort_cached_and_invalidated():
+    g = diamond()
+    order = g.toposort()
+    assert g.toposort() is order
+    g.edge(1.0, 'x')
+    assert g.toposort() is not order
+    assert g.toposort() == ('a', 'x', 'b', 'c', 'r')
+
+
+def test_toposort_follows_root():
+    g = diamond()
+    g.toposort()
+    g.root = 'c'
+    assert g.toposort() == ('a', 'c')
+
+
+def test_no_side_effects_on_incoming():
+    g = diamond()
+    before = set(g.incoming)
+    g.toposort(); g.terminals(); g.inside(); g.outside(g.inside())
+    assert set(g.incoming) == before
+
+
+def test_terminals_cached():
+    g = diamond()
+    ts = g.terminals()
+    assert ts == {'x'}
+    assert g.terminals() is ts
+    g.edge(1.0, 'x')
+    assert g.terminals() == set()
+
+
+def test_cycle_detected():
+    g = Hypergraph(root='a', kind=Float)
+    g.edge(1.0, 'a', 'b')
+    g.edge(1.0, 'b', 'a')
+    try:
+        g.toposort()
+    except AssertionError:
+        return
+    assert False, 'toposort of a cyclic hypergraph should have raised'
+
+
+def test_freeze():
+    g = diamond().freeze()
+    try:
+        g.edge(1.0, 'x')
+    except AssertionError:
+        return
+    assert False, 'adding an edge to a frozen hypergraph should have raised'
+
+
+# --- pruning ----------------------------------------------------------------
+
+def test_prune_topo_single_pass():
+    # 'x' is a dead end two edges below the root: the old fixed-point pruning
+    # needed a round per step; the masks find it at once.
+    g = diamond()
+    g.edge(1.0, 'r', 'd')
+    g.edge(1.0, 'd', 'e')
+    g.edge(1.0, 'e', 'x')
+    g.edge(1.0, 'u', 'a')             # not reachable from the root
+    nodes, edges = g.compile().prune_mask()
+    assert edges.tolist() == [True, False, True, False, True, False, False, False, False]
+    assert nodes.sum() == 3
+    out = io.StringIO()
+    with redirect_stdout(out):
+        p = g.prune_topo(verbose=1)
+    assert [(e.head, e.body) for e in p.edges] == [('a', ()), ('c', ('a',)), ('r', ('c', 'c'))]
+    assert p.Z() == g.Z() == 5*3*3
+    assert 'removed 5 of 8 nodes and 6 of 9 edges' in out.getvalue()
+
+
+def test_unreachable_cycle():
+    # The root cannot reach the cycle u <-> v, so it does not get in the way.
+    g = diamond()
+    g.edge(1.0, 'u', 'v'); g.edge(1.0, 'v', 'u'); g.edge(1.0, 'u', 'a')
+    p = g.prune_topo()
+    assert p.Z() == g.Z() and 'u' not in p.incoming
+    B = g.inside(engine='numpy')
+    assert B[g.root] == g.Z() and 'u' not in B
+    A = g.outside(B, engine='numpy')
+    assert A['a'] == g.outside(g.inside())['a']
+
+
+# --- outside ----------------------------------------------------------------
+
+class Mat:
+    "2x2 real matrices: a non-commutative semiring."
+    def __init__(self, m): self.m = np.asarray(m, dtype=float)
+    def __add__(self, other): return Mat(self.m + other.m)
+    def __mul__(self, other): return Mat(self.m @ other.m)
+    @classmethod
+    def chart(cls): return Chart(cls.zero)
+
+Mat.zero = Mat(np.zeros((2, 2)))
+Mat.one = Mat(np.eye(2))
+
+
+def flat_graph():
+    rng = np.random.default_rng(0)
+    M = lambda: Mat(rng.normal(size=(2, 2)))
+    g = Hypergraph(root='r', kind=Mat)
+    for x in 'abc':
+        g.edge(M(), x)
+    g.edge(M(), 's', 'c', 'b')
+    g.edge(M(), 'r', 'a', 'b', 'c', 'a', 's')
+    g.edge(M(), 'r', 's', 'a')
+    return g
+
+
+def brute_outside(g, B):
+    "Outside with the hole punched at each body position, one product at a time."
+    A = g.kind.chart()
+    A[g.root] = g.kind.one
+    for x in reversed(g.toposort()):
+        for e in g.incoming[x]:
+            for i, y in enumerate(e.body):
+                v = e.weight
+                for j, z in enumerate(e.body):
+                    v = v * (A[x] if i == j else B[z])
+                A[y] = A[y] + v
+    return A
+
+
+def test_outside_noncommutative():
+    g = flat_graph()
+    B = g.inside()
+    A = g.outside(B)
+    want = brute_outside(g, B)
+    assert set(A) == set(want)
+    for x in want:
+        assert np.allclose(A[x].m, want[x].m), x
+    cg = g.compile()
+    a = cg.outside(cg.inside())
+    for x in want:
+        assert np.allclose(a[cg.index[x]].m, want[x].m), x
+
+
+def test_outside_repeated_body_node():
+    g = Hypergraph(root='r', kind=Float)
+    g.edge(2.0, 'a')
+    g.edge(3.0, 'b')
+    g.edge(0.5, 'r', 'a', 'b', 'a')
+    A = g.outside(g.inside())
+    # Z = 0.5 a^2 b, so dZ/da = a b and dZ/db = 0.5 a^2
+    assert A['a'] == 2*0.5*2.0*3.0
+    assert A['b'] == 0.5*2.0*2.0
+
+
+# --- fused ------------------------------------------------------------------
+
+def test_fuse():
+    from semirings import MinPlus
+    from hypergraphs.apps.matrix_chain import matrix_chain
+    dims = [10, 30, 5, 60, 8]
+    g = matrix_chain(dims, MinPlus)
+    f = matrix_chain(dims, MinPlus, fuse=True)
+    assert f.Z().cost == g.Z().cost == 4300
+    assert f.viterbi()[1] == g.viterbi()[1] is not None
+    # Without the edges, the chart and backpointers remain.
+    h = Hypergraph(root=g.root).fuse(keep_edges=False)
+    for e in g.edges: h.edge(e.weight, e.head, *e.body)
+    assert not h.edges and h.Z().cost == 4300 and h.viterbi()[1] == g.viterbi()[1]
+    # Real weights.
+    r = Hypergraph(root='r', kind=Float).fuse()
+    r.edge(2.0, 'a'); r.edge(3.0, 'a'); r.edge(0.5, 'r', 'a', 'a')
+    assert r.Z() == 0.5 * 25
+    # Bodies must be final.
+    try:
+        r.edge(1.0, 'a')
+    except AssertionError:
+        pass
+    else:
+        raise AssertionError('expected failure')
+    # `inside` returns a copy of the chart.
+    B = r.inside()
+    B['r'] = 0.0
+    assert r.Z() == 0.5 * 25 and r.inside()['r'] == 0.5 * 25
+
+
+def test_viterbi_deep():
+    from semirings import MaxPlus
+    g = chain(5000, MaxPlus(-1.0), MaxPlus)
+    v, d = g.viterbi()
+    assert v.score == -5001 and depth(d) == 5000
+    f = Hypergraph(root=g.root).fuse()
+    for e in g.edges: f.edge(e.weight, e.head, *e.body)
+    v, d = f.viterbi()
+    assert v.score == -5001 and depth(d) == 5000
+
+
+if __name__ == '__main__':
+    funcs = [f for name, f in sorted(globals().items()) if name.startswith('test_')]
+    for f in funcs:
+        f()
+        print(f'ok  {f.__name__}')
+    print(f'\n{len(funcs)} passed')
@@ -0,0 +1,65 @@
+"""Tests for incremental inside after weight updates."""
+
+import numpy as np
+
+from semirings import Float, LogVal, MaxPlus
+from hypergraphs.hypergraph import Hypergraph
+
+from forests import ab_forest, reweighted
+
+
+def check(kind, lift, close, delta=None):
+    rng = np.random.default_rng(0)
+    g = ab_forest('a b b a b a .', kind, lift)
+    inc = g.incremental(delta=delta)
+    assert inc.delta == (kind in (Float, LogVal) if delta is None else delta)
+    for _ in range(20):
+        m = rng.integers(1, 4)
+        changes = {int(i): lift(float(rng.uniform(0.1, 2))) for i in rng.choice(len(g.edges), m)}
+        if rng.random() < 0.5:
+            changes = {g.edges[i]: v for i, v in changes.items()}
+        inc.update(changes)
+        want = reweighted(g, inc.weight).inside()
+        for x in g.toposort():
+            assert close(inc[x], want[x]), [x, inc[x], want[x]]
+    inc.refresh()
+    assert close(inc.Z, reweighted(g, inc.weight).Z())
+
+
+def test_delta():
+    check(Float, float, np.isclose)
+    check(LogVal, LogVal.lift, lambda a, b: np.isclose(a.ell, b.ell))
+
+
+def test_recompute():
+    check(MaxPlus, MaxPlus, lambda a, b: np.isclose(a.score, b.score))
+    check(Float, float, np.isclose, delta=False)
+
+
+def test_tiny_change():
+    # LogVal's `==` would call these equal.
+    g = Hypergraph(root='r', kind=LogVal)
+    a = g.edge(LogVal.lift(1e-12), 'a')
+    g.edge(LogVal.one, 'r', 'a')
+    inc = g.incremental()
+    assert set(inc.update({a: LogVal.lift(5e-12)})) == {'a', 'r'}
+    assert np.isclose(np.exp(inc.Z.ell), 5e-12, rtol=1e-9, atol=0)
+
+
+def test_cone():
+    g = ab_forest('a b b a b a .')
+    inc = g.incremental()
+    # Only the root depends on an edge into the root.
+    [e] = [e for e in g.edges if e.head == g.root]
+    assert inc.update({e: 2 * e.weight}) == [g.root]
+    assert np.isclose(inc.Z, 2 * g.Z())
+    # An unchanged weight changes nothing.
+    assert inc.update({e: inc.weight[g.edges.index(e)]}) == []
+
+
+if __name__ == '__main__':
+    funcs = [f for name, f in sorted(globals().items()) if name.startswith('test_')]
+    for f in funcs:
+        f()
+        print(f'ok  {f.__name__}')
+    print(f'\n{len(funcs)} passed')
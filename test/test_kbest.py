@@ -0,0 +1,69 @@
+"""Tests for lazy k-best extraction."""
+
+import numpy as np
+from itertools import islice, product
+
+from semirings import Float, MaxPlus, MinPlus
+from hypergraphs.kbest import KBest
+from hypergraphs.apps.matrix_chain import matrix_chain
+
+from forests import papa_forest, chain, depth
+
+
+def enumerate_derivations(g, x):
+    "All derivations of `x` with their total score, by brute force."
+    for e in g.incoming.get(x, ()):
+        for ds in product(*(list(enumerate_derivations(g, b)) for b in e.body)):
+            yield e.weight.score + sum(s for s, _ in ds), (e, *(d for _, d in ds))
+
+
+def score(d):
+    e, *ds = d
+    return e.weight.score + sum(score(d) for d in ds)
+
+
+def test_matches_brute_force():
+    g = papa_forest(MaxPlus)
+    want = sorted((s for s, _ in enumerate_derivations(g, g.root)), reverse=True)
+    have = list(g.kbest())
+    assert len(have) == len(want)
+    assert np.allclose([v.score for v, _ in have], want)
+    assert all(np.isclose(score(d), v.score) for v, d in have)
+    assert len({d for _, d in have}) == len(have)          # no duplicates
+    assert have[0][0] == g.Z()
+
+
+def test_resume_and_limit():
+    g = papa_forest(MaxPlus)
+    every = [v.score for v, _ in g.kbest()]
+    first = [v.score for v, _ in g.kbest(10)]
+    it = g.kbest()
+    assert [v.score for v, _ in islice(it, 5)] + [v.score for v, _ in islice(it, 5)] == first
+    assert first == every[:10]
+    k = KBest(g.compile(), limit=7)
+    assert [v.score for v, _ in k.derivations()] == every[:7]
+    assert all(len(D) <= 7 for D in k.D)
+
+
+def test_other_semirings():
+    g = papa_forest(Float)
+    h = papa_forest(MaxPlus)
+    assert np.allclose([np.log(v) for v, _ in g.kbest(20)], [v.score for v, _ in h.kbest(20)])
+    assert next(matrix_chain([10, 30, 5, 60], MinPlus).kbest())[0].cost == 4500
+
+
+
+def test_deep_derivation():
+    g = chain(5000, MaxPlus(-1.0), MaxPlus)
+    g.edge(MaxPlus(-2.0), 0)
+    [(v, d), (u, c)] = g.kbest(2)
+    assert v.score == -5001 and depth(d) == 5000
+    assert u.score == -5002 and depth(c) == 5000
+
+
+if __name__ == '__main__':
+    funcs = [f for name, f in sorted(globals().items()) if name.startswith('test_')]
+    for f in funcs:
+        f()
+        print(f'ok  {f.__name__}')
+    print(f'\n{len(funcs)} passed')
@@ -0,0 +1,93 @@
+"""Tests for `LazyHypergraph`."""
+
+import numpy as np
+from collections import Counter
+
+from semirings import Float, MaxPlus
+from hypergraphs.lazy import LazyHypergraph
+from hypergraphs.apps.segmentation import segmentation
+
+from forests import depth
+
+
+def segmentations(x, g, kind, L=3):
+    "The recurrence of `apps.segmentation` as a lazy hypergraph over positions."
+    def incoming(i):
+        if i == 0:
+            yield kind.one, ()
+        for j in range(max(i-L, 0), i):
+            w = g(x[j:i])
+            if w is not None:
+                yield kind.lift(w, x[j:i]), (j,)
+    return LazyHypergraph(len(x), kind, range(len(x)+1), incoming)
+
+
+def score(x):
+    return {'a': 1.0, 'ab': 3.0, 'b': 0.5, 'abc': 0.25, 'c': 2.0, 'bc': 1.5}.get(x)
+
+
+X = 'abcabcab'
+
+
+def test_inside_matches_recurrence():
+    for kind in [Float, MaxPlus]:
+        h = segmentations(X, score, kind)
+        assert h.Z() == segmentation(X, score, kind, L=3)
+
+
+def test_outside_matches_materialized():
+    for record in [False, True]:
+        h = segmentations(X, score, Float)
+        h.record = record
+        g = h.materialize()
+        assert len(g.edges) == sum(1 for _ in h.edges())
+        B = h.inside(); A = h.outside(B)
+        assert bool(h._edges) == record
+        b = g.inside(); a = g.outside(b)
+        for x in a:
+            assert np.isclose(A[x], a[x]) and np.isclose(B[x], b[x])
+
+
+def test_viterbi():
+    h = segmentations(X, lambda x: None if score(x) is None else np.log(score(x)), MaxPlus)
+    v, d = h.viterbi()
+    assert v == h.Z()
+    # Walk the backpointers: each edge's head is the segment's end.
+    segs = []
+    while d[1:]:
+        e, d = d
+        segs.append(e.weight.d)
+    assert ''.join(reversed(segs)) == X
+    assert np.isclose(sum(np.log(score(s)) for s in segs), v.score)
+
+
+def test_sample():
+    h = segmentations('abc', score, Float)
+    B = h.inside()
+    rng = np.random.default_rng(0)
+    def segs(d):
+        e, *ds = d
+        if not e.body: return ()
+        [d] = ds
+        return segs(d) + ('abc'[e.body[0]:e.head],)
+    counts = Counter(segs(h.sample(B, rng=rng)) for _ in range(5000))
+    Z = B[h.root]
+    for s, p in [(('ab', 'c'), 3*2), (('a', 'bc'), 1.5), (('abc',), 0.25), (('a', 'b', 'c'), 1)]:
+        assert abs(counts[s]/5000 - p/Z) < 0.03, (s, counts[s], p/Z)
+
+
+def test_long_lattice():
+    # Derivations deeper than the recursion limit.
+    x = 'a' * 5000
+    v, d = segmentations(x, lambda s: 0.0 if s == 'a' else None, MaxPlus).viterbi()
+    assert v.score == 0 and depth(d) == 5000
+    h = segmentations(x, lambda s: 1.0 if s == 'a' else None, Float)
+    assert depth(h.sample()) == 5000
+
+
+if __name__ == '__main__':
+    funcs = [f for name, f in sorted(globals().items()) if name.startswith('test_')]
+    for f in funcs:
+        f()
+        print(f'ok  {f.__name__}')
+    print(f'\n{len(funcs)} passed')
@@ -0,0 +1,69 @@
+"""Tests for out-of-core inside evaluation."""
+
+import os
+import numpy as np
+from tempfile import TemporaryDirectory
+
+from semirings import Float, LogVal
+from hypergraphs.compiled import CompiledHypergraph
+from hypergraphs import vectorized, outofcore
+
+from forests import ab_forest
+
+
+def test_inside():
+    cg = ab_forest('a b b a b a b .').compile()
+    want = vectorized.inside(cg, vectorized.REAL)
+    with TemporaryDirectory() as d:
+        path = os.path.join(d, 'g.levels')
+        outofcore.save(cg, path)
+        for block in [1, 3, 1 << 20]:
+            Z, B, stats = outofcore.inside(path, block=block)
+            assert np.allclose(B, want)
+            assert np.isclose(Z, want[cg.root])
+            assert stats['levels'] == len(cg.levels)
+            assert stats['blocks'] >= stats['levels']
+            assert stats['bytes_read'] > 0 and stats['peak_rss'] > 0
+        assert stats['blocks'] == stats['levels']
+
+
+def test_frontier():
+    for kind, S in [(Float, vectorized.REAL), (LogVal, vectorized.LOG)]:
+        cg = ab_forest('a b b a b a b .', kind).compile()
+        want = vectorized.inside(cg, S)[cg.root]
+        for T in [S, vectorized.MAXPLUS]:
+            w = None if T is S else cg.lower(S)
+            with TemporaryDirectory() as d:
+                path = os.path.join(d, 'g.levels')
+                outofcore.save(cg, path, S=T, weight=w, frontier=True)
+                Z, B, stats = outofcore.inside(path, block=2)
+                assert B is None
+                assert stats['chart_bytes'] < cg.num_nodes * 8
+                expect = want if T is S else vectorized.inside(cg, T, w)[cg.root]
+                assert np.isclose(Z, expect), [Z, expect]
+
+
+
+def test_save_memory_mapped():
+    # Levels and slots come from the (memory-mapped) arrays, block by block,
+    # without Python-list copies of them.
+    g = ab_forest('a b b a b a b .')
+    want = vectorized.inside(g.compile(), vectorized.REAL)[g.compile().root]
+    with TemporaryDirectory() as d:
+        g.compile().save(os.path.join(d, 'g.npz'))
+        cg, _ = CompiledHypergraph.load(os.path.join(d, 'g.npz'))
+        assert all(np.array_equal(vectorized.node_levels(cg, block), vectorized.node_levels(cg))
+                   for block in [1, 2, 5])
+        path = os.path.join(d, 'g.levels')
+        outofcore.save(cg, path, frontier=True)
+        assert 'lists' not in cg._derived
+        Z, _, _ = outofcore.inside(path)
+        assert np.isclose(Z, want)
+
+
+if __name__ == '__main__':
+    funcs = [f for name, f in sorted(globals().items()) if name.startswith('test_')]
+    for f in funcs:
+        f()
+        print(f'ok  {f.__name__}')
+    print(f'\n{len(funcs)} passed')
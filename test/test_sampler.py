@@ -0,0 +1,109 @@
+"""Tests for the alias-table sampler."""
+
+import numpy as np
+from collections import Counter
+
+from semirings import Float
+from hypergraphs.pcfg import WCFG
+from hypergraphs.compiled import CompiledHypergraph
+from hypergraphs.sampler import CDFSampler, _alias_tables
+
+from forests import papa_forest
+
+
+def forest():
+    g = papa_forest(sentence='Papa ate the caviar .')
+    h = WCFG(g.root, Float)
+    for e in g.edges: h.edge(e.weight, e.head, *e.body)
+    return h
+
+
+def test_alias_tables():
+    rng = np.random.default_rng(0)
+    q = rng.uniform(size=10); q[3] = 0
+    ptr = np.array([0, 1, 5, 10])
+    prob, alias = _alias_tables(q, ptr)
+    # Probability of each outcome implied by the table.
+    for a, b in zip(ptr, ptr[1:]):
+        n = b - a
+        implied = np.zeros(len(q))
+        for i in range(a, b):
+            implied[i] += prob[i] / n
+            implied[alias[i]] += (1 - prob[i]) / n
+        assert np.allclose(implied[a:b], q[a:b] / q[a:b].sum())
+
+
+def test_distribution():
+    g = forest()
+    P = g.to_PCFG()
+    S = P.sample(20_000, rng=np.random.default_rng(0))
+    assert len(S) == 20_000
+    # Exact probability of a derivation: product of the WCFG weights over Z.
+    w = {(e.head, e.body): e.weight for e in g.edges}
+    Z = g.Z()
+    key = lambda i: tuple(sorted(S[i].tolist()))
+    counts = Counter(key(i) for i in range(len(S)))
+    p = {}
+    logprob = S.logprob
+    for i in range(len(S)):
+        if key(i) in p: continue
+        p[key(i)] = np.prod([w[P.edges[e].head, P.edges[e].body] for e in S[i].tolist()]) / Z
+        assert np.isclose(np.exp(logprob[i]), p[key(i)])
+    assert np.isclose(sum(p.values()), 1)      # every derivation was drawn
+    for d in p:
+        assert abs(counts[d] / len(S) - p[d]) < 0.01, d
+
+
+def test_sample_from_inside():
+    g = forest()
+    Z = g.Z()
+    rng = np.random.default_rng(0)
+    S, logprob = g.sample(20_000, logprob=True, rng=rng)
+    counts = Counter(tuple(S[i].tolist()) for i in range(len(S)))
+    for i in range(len(S)):
+        d = tuple(S[i].tolist())
+        p = np.prod([g.edges[e].weight for e in d]) / Z
+        assert np.isclose(np.exp(logprob[i]), p)
+        assert abs(counts[d] / len(S) - p) < 0.01, d
+    # A precomputed chart (or array) gives the same draws.
+    cg = g.compile()
+    B = g.inside()
+    a = g.sample(100, rng=np.random.default_rng(1))
+    b = g.sample(100, inside=B, rng=np.random.default_rng(1))
+    c = g.sample(100, inside=np.array([B[x] for x in cg.nodes]), rng=np.random.default_rng(1))
+    assert np.array_equal(a.edges, b.edges) and np.array_equal(a.edges, c.edges)
+    # Same draws with LogVal weights.
+    from semirings import LogVal
+    h = g.apply(lambda e: LogVal.lift(e.weight)); h.kind = LogVal
+    a, pa = g.sample(200, logprob=True, rng=np.random.default_rng(3))
+    b, pb = h.sample(200, logprob=True, rng=np.random.default_rng(3))
+    assert np.array_equal(a.edges, b.edges) and np.allclose(pa, pb)
+
+
+def test_cdf_resolution():
+    # Rare edges into a node with a large id are drawn at their rate.
+    N = 1 << 22
+    ids = lambda *xs: np.array(xs, dtype=np.int32)
+    cg = CompiledHypergraph(range(N + 1), head=ids(N, N, N), body_ptr=np.arange(4), body=ids(0, 1, 2),
+                            weight=np.ones(3), root=N, kind=Float)
+    p = np.array([1e-9, 1 - 2e-9, 1e-9])
+    s = CDFSampler(cg, p)
+    assert np.allclose(s.cdf[cg.in_ptr[N]:], np.cumsum(p), rtol=1e-12, atol=0)
+    p = np.array([1e-3, 1 - 2e-3, 1e-3])
+    e = CDFSampler(cg, p).sample(200_000, rng=np.random.default_rng(0)).edges
+    assert 0.8 < (e == 0).mean() / 1e-3 < 1.2 and 0.8 < (e == 2).mean() / 1e-3 < 1.2
+
+
+def test_tree():
+    P = forest().to_PCFG()
+    t = P.sample(rng=np.random.default_rng(1))
+    assert t.label() == P.root
+    assert [s.label()[2] for s in t.subtrees() if not len(s)] == 'Papa ate the caviar .'.split()
+
+
+if __name__ == '__main__':
+    funcs = [f for name, f in sorted(globals().items()) if name.startswith('test_')]
+    for f in funcs:
+        f()
+        print(f'ok  {f.__name__}')
+    print(f'\n{len(funcs)} passed')
@@ -0,0 +1,77 @@
+"""Tests for the on-disk format of compiled hypergraphs."""
+
+import os
+import numpy as np
+from tempfile import TemporaryDirectory
+
+from semirings import Float, LogVal
+from hypergraphs import vectorized
+from hypergraphs.compiled import CompiledHypergraph
+from hypergraphs.storage import MAGIC, _Nodes
+
+from forests import ab_forest
+
+
+def test_roundtrip():
+    cg = ab_forest('a b b a b .').compile()
+    B = vectorized.inside(cg, vectorized.REAL)
+    with TemporaryDirectory() as d:
+        path = os.path.join(d, 'g.hg')
+        cg.save(path, inside=B)
+        for mmap in [True, False]:
+            h, charts = CompiledHypergraph.load(path, mmap=mmap)
+            assert isinstance(h.head, np.memmap) == mmap
+            assert isinstance(h.nodes, _Nodes) and h.nodes._nodes is None    # not unpickled yet
+            for name in ['head', 'body_ptr', 'body', 'in_edge', 'in_ptr', 'weight']:
+                assert np.array_equal(getattr(h, name), getattr(cg, name)), name
+            assert h.root == cg.root and h.kind is Float
+            assert np.array_equal(charts['inside'], B)
+            assert np.allclose(vectorized.inside(h, vectorized.REAL), B)
+            assert np.allclose(h.inside(), cg.inside())
+            assert list(h.nodes) == list(cg.nodes)
+            del h, charts
+
+
+def test_lowered_weights():
+    g = ab_forest('a b b a b .', LogVal)
+    cg = g.compile()
+    B = vectorized.inside(cg, vectorized.LOG)
+    with TemporaryDirectory() as d:
+        path = os.path.join(d, 'g.hg')
+        cg.save(path)
+        h, charts = CompiledHypergraph.load(path)
+        assert charts == {} and h.kind is LogVal
+        assert np.allclose(vectorized.inside(h, vectorized.LOG), B)
+        h, _ = CompiledHypergraph.load(path, lift=True)
+        assert h.weight.dtype == object
+        assert np.allclose(h.Z().ell, g.Z().ell)
+        del h, _
+
+
+def test_bad_file():
+    with TemporaryDirectory() as d:
+        path = os.path.join(d, 'g.hg')
+        with open(path, 'wb') as f:
+            f.write(b'not a hypergraph')
+        try:
+            CompiledHypergraph.load(path)
+        except AssertionError:
+            pass
+        else:
+            raise AssertionError('expected failure')
+        with open(path, 'wb') as f:
+            f.write(MAGIC + (99).to_bytes(4, 'little') + (2).to_bytes(4, 'little') + b'{}')
+        try:
+            CompiledHypergraph.load(path)
+        except AssertionError as e:
+            assert 'version 99' in str(e)
+        else:
+            raise AssertionError('expected failure')
+
+
+if __name__ == '__main__':
+    funcs = [f for name, f in sorted(globals().items()) if name.startswith('test_')]
+    for f in funcs:
+        f()
+        print(f'ok  {f.__name__}')
+    print(f'\n{len(funcs)} passed')
@@ -0,0 +1,155 @@
+"""Tests for the vectorized scalar-semiring engine."""
+
+import numpy as np
+
+from semirings import Float, LogVal, MaxPlus, MinPlus, Boolean, LazySort
+from hypergraphs.hypergraph import Hypergraph
+from hypergraphs.vectorized import scalar_semiring, REAL
+
+from forests import papa_forest
+
+
+KINDS = [
+    (Float, float, float),
+    (LogVal, LogVal.lift, float),
+    (MaxPlus, MaxPlus, lambda x: x.score),
+    (MinPlus, MinPlus, lambda x: x.cost),
+    (Boolean, lambda x: Boolean(x > 0.2), lambda x: x.score),
+]
+
+
+def test_inside_outside_match_generic():
+    for kind, lift, value in KINDS:
+        g = papa_forest(kind, lift)
+        B = g.inside(); A = g.outside(B)
+        b = g.inside(engine='numpy'); a = g.outside(b, engine='numpy')
+        for x in B:
+            assert np.allclose(value(B[x]), value(b[x])), (kind, x)
+        for x in A:
+            assert np.allclose(value(A[x]), value(a[x])), (kind, x)
+
+
+def test_high_arity_outside():
+    g = Hypergraph(root='r', kind=Float)
+    for x, w in zip('abcd', [0.5, 2.0, 3.0, 0.0]):
+        g.edge(w, x)
+    g.edge(1.5, 'r', 'a', 'b', 'c', 'a')
+    g.edge(0.5, 'r', 'a', 'b', 'c', 'd', 'b')
+    g.edge(1.0, 'r')
+    B = g.inside(engine='numpy'); A = g.outside(B, engine='numpy')
+    assert np.allclose(B['r'], 1.5*0.5*2*3*0.5 + 1.0)
+    # d/dw_a of Z = 1.5*(2*3*0.5 + 0.5*2*3)
+    assert np.allclose(A['a'], 1.5*2*3*0.5*2)
+    assert np.allclose(A['d'], 0.5*0.5*2*3*2)
+
+
+def test_batch_matches_single():
+    from hypergraphs.vectorized import inside, outside, LOG, MAXPLUS
+    g = papa_forest(LogVal)
+    cg = g.compile()
+    w = cg.lower(LOG)
+    rng = np.random.default_rng(1)
+    # Gumbel-perturbed copies of the log-weights
+    W = w + rng.gumbel(size=(5, cg.num_edges))
+    for S in [LOG, MAXPLUS]:
+        B, A = g.inside_batch(W, outside=True, semiring=S)
+        assert B.shape == A.shape == (5, cg.num_nodes)
+        for i in range(5):
+            b = inside(cg, S, W[i])
+            assert np.allclose(B[i], b)
+            assert np.allclose(A[i], outside(cg, S, b, W[i]))
+
+
+def test_grad():
+    from hypergraphs.vectorized import inside, REAL
+    from hypergraphs.pcfg import WCFG
+    g = papa_forest(Float)
+    cg = g.compile()
+    w = cg.lower(REAL)
+    G = g.grad()
+    assert G.shape == (len(g.edges),)
+    def logZ(w): return np.log(inside(cg, REAL, w)[cg.root])
+    eps = 1e-6
+    for e in range(0, cg.num_edges, 7):
+        d = np.zeros_like(w); d[e] = eps
+        fd = (logZ(w + d) - logZ(w - d)) / (2*eps)
+        assert np.isclose(G[e], fd, rtol=1e-4, atol=1e-8), (e, G[e], fd)
+    # With log=True we get the edge marginals.
+    h = WCFG(g.root, Float)
+    for e in g.edges: h.edge(e.weight, e.head, *e.body)
+    B, A = h.sum_product()
+    M = h.edge_marginals(B, A)
+    Z = B[h.root]
+    assert np.allclose(g.grad(log=True), [M[e]/Z for e in h.edges])
+    # Same weights as LogVals
+    assert np.allclose(papa_forest(LogVal).grad(), G)
+
+
+def test_grad_zero_weight():
+    # Z = 0*a + 3*b + 1*a*b with a = 1, b = 2.
+    g = Hypergraph(root='r', kind=Float)
+    g.edge(1.0, 'a'); g.edge(2.0, 'b')
+    g.edge(0.0, 'r', 'a'); g.edge(3.0, 'r', 'b'); g.edge(1.0, 'r', 'a', 'b')
+    with np.errstate(all='raise'):
+        G = g.grad()
+        M = g.grad(log=True)
+    assert np.allclose(G[2:], [1/8, 2/8, 2/8])
+    assert np.allclose(M, [2/8, 1, 0, 6/8, 2/8])
+
+
+def test_workers_bit_identical():
+    from hypergraphs import vectorized
+    g = papa_forest(LogVal)
+    cg = g.compile()
+    W = cg.lower(vectorized.LOG) + np.random.default_rng(2).gumbel(size=(3, cg.num_edges))
+    was = vectorized.MIN_CHUNK
+    vectorized.MIN_CHUNK = 4
+    try:
+        assert max(len(parts) for parts in cg.chunked_levels(4)) > 1
+        for S in [vectorized.LOG, vectorized.MAXPLUS]:
+            B, A = g.inside_batch(W, outside=True, semiring=S)
+            b, a = g.inside_batch(W, outside=True, semiring=S, workers=4)
+            assert np.array_equal(B, b) and np.array_equal(A, a)
+        B = g.inside(engine='numpy'); A = g.outside(B, engine='numpy')
+        b = g.inside(engine='numpy', workers=3); a = g.outside(b, engine='numpy', workers=3)
+        assert all(B[x].ell == b[x].ell for x in B) and all(A[x].ell == a[x].ell for x in A)
+    finally:
+        vectorized.MIN_CHUNK = was
+
+
+def test_expected_features():
+    g = papa_forest(Float)
+    F = np.random.default_rng(0).uniform(size=(len(g.edges), 50))
+    B = g.inside(); A = g.outside(B)
+    _, want = g.insideout(B, A, lambda e: e.weight * F[g.edges.index(e)], np.zeros(50))
+    assert np.allclose(g.expected_features(F), want / B[g.root])
+    assert np.allclose(g.feature_totals(F, B, A), want)
+    assert np.allclose(papa_forest(LogVal).expected_features(F), want / B[g.root])
+    # Several values per edge give one column each.
+    v = g.feature_totals(F, B, A, value=lambda k: (k, 2*k))
+    assert v.shape == (50, 2) and np.allclose(v, np.c_[want, 2*want])
+    # Expectations stay finite when Z overflows a float.
+    g = Hypergraph(root=40, kind=LogVal)
+    g.edge(LogVal.lift(1e13), 0); g.edge(LogVal.lift(1e13), 0)
+    for i in range(1, 41):
+        g.edge(LogVal.lift(1e13), i, i - 1)
+    assert g.Z().ell > 1200
+    assert np.allclose(g.expected_features(np.eye(len(g.edges))), [0.5, 0.5] + [1]*40)
+
+
+def test_fallback_for_other_semirings():
+    assert scalar_semiring(LazySort) is None
+    assert scalar_semiring(Float) is REAL
+    g = Hypergraph(root='r', kind=LazySort)
+    g.edge(LazySort(1.0, 'a'), 'a')
+    g.edge(LazySort(2.0, 'r'), 'r', 'a')
+    [x] = list(g.inside(engine='numpy')['r'])
+    assert x.score == 2.0
+
+
+if __name__ == '__main__':
+    funcs = [f for name, f in sorted(globals().items()) if name.startswith('test_')]
+    for f in funcs:
+        f()
+        print(f'ok  {f.__name__}')
+    print(f'\n{len(funcs)} passed')